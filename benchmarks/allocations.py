@@ -0,0 +1,43 @@
+# Memory traced by tracemalloc during a long firefight: every player keeps
+# firing, so bullets are spawned and retired every tick. With the bullet pool
+# the traced size should stop growing once the first volleys are in flight.
+#
+#   python benchmarks/allocations.py
+import random
+import tracemalloc
+
+from common import load_game_server
+
+game_server = load_game_server()
+
+PLAYERS = 50
+TICKS = 2000
+REPORT_EVERY = 200
+
+
+def main():
+    rng = random.Random(0)
+    server = game_server.GameServer()
+    for i in range(PLAYERS):
+        player = server.new_player(rng.uniform(0, 740), rng.uniform(0, 725), i, None)
+        # hits still land, but nobody dies and leaves the fight
+        player.life_point = 10 ** 9
+        server.add_player(player)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    print(f"{'tick':>6} {'traced KiB':>11} {'bullets':>8} {'created':>8}")
+    for tick in range(1, TICKS + 1):
+        for player in server.players:
+            if player.fire < 3:
+                player.fire += 1
+                server.spawn_bullet(player, tick)
+        server.update_state()
+        if tick % REPORT_EVERY == 0:
+            current = tracemalloc.get_traced_memory()[0]
+            print(f"{tick:>6} {(current - baseline) / 1024:>11.1f} {len(server.bullets):>8} {server.bullet_pool.created:>8}")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Tick cost of GameServer.update_state with the spatial hash broad-phase
+# against the old all-pairs loop, at 10/100/1000 players.
+#
+#   python benchmarks/collisions.py
+import random
+import time
+
+from common import load_game_server, square_field
+
+game_server = load_game_server()
+protocol = game_server.protocol
+
+TICKS = 50
+
+
+def populate(server, player_count, seed):
+    rng = random.Random(seed)
+    side = square_field(server, player_count)
+    for i in range(player_count):
+        player = game_server.Player(rng.uniform(0, side), rng.uniform(0, side), i)
+        player.speed_x = rng.choice([-1, 0, 1]) * server.thrust
+        player.speed_y = rng.choice([-1, 0, 1]) * server.thrust
+        server.players.append(player)
+    for i in range(player_count):
+        bullet = game_server.Bullet()
+        bullet.player_id = rng.randrange(player_count)
+        bullet.seq = i
+        bullet.x = rng.uniform(0, side)
+        bullet.y = rng.uniform(0, side)
+        server.bullets.append(bullet)
+
+
+def all_pairs_update_state(server):
+    # the pre broad-phase tick, kept here as the reference
+    game_state_encoded = ''
+    dt = server.dt
+    friction = server.acceleration * 0.5 * dt
+    for player in server.players:
+        for other_player in server.players:
+            if other_player.id != player.id:
+                future_player_x = player.x + player.speed_x * dt
+                future_player_y = player.y + player.speed_y * dt
+                future_other_player_x = other_player.x + other_player.speed_x * dt
+                future_other_player_y = other_player.y + other_player.speed_y * dt
+                if abs(future_player_x - future_other_player_x) < server.player_width and abs(future_player_y - future_other_player_y) < server.player_height:
+                    player.speed_x = 0
+                    player.speed_y = 0
+
+        player.x += player.speed_x * dt
+        player.y += player.speed_y * dt
+
+        if player.x < 0:
+            player.x = 0
+            player.speed_x = 0
+        elif player.x > server.game_field_width - server.player_width:
+            player.x = server.game_field_width - server.player_width
+            player.speed_x = 0
+        if player.y < 0:
+            player.y = 0
+            player.speed_y = 0
+        elif player.y > server.game_field_height - server.player_height:
+            player.y = server.game_field_height - server.player_height
+            player.speed_y = 0
+
+        if player.speed_x > 0:
+            player.speed_x -= friction
+        elif player.speed_x < 0:
+            player.speed_x += friction
+        if player.speed_y > 0:
+            player.speed_y -= friction
+        elif player.speed_y < 0:
+            player.speed_y += friction
+
+        for bullet in server.bullets:
+            if player.id != bullet.player_id:
+                if abs(player.x - bullet.x) <= server.player_width and abs(player.y - (bullet.y + bullet.speed_y * dt)) <= server.player_height:
+                    bullet.is_active = False
+                    player.life_point -= 1
+
+        game_state_encoded += f'{player.id},{player.x},{player.y},{player.life_point},'
+
+    game_state_encoded += f':'
+
+    if len(server.bullets) == 0:
+        game_state_encoded += ","
+
+    for bullet in server.bullets:
+        bullet.y += bullet.speed_y * dt
+        if bullet.x < 0 or bullet.x > server.game_field_width or bullet.y < 0 or bullet.y > server.game_field_height:
+            bullet.is_active = False
+
+        game_state_encoded += f'{bullet.id}, {int(bullet.is_active)}, {bullet.x}, {bullet.y},'
+
+        if not bullet.is_active:
+            for player in server.players:
+                if bullet.player_id == player.id:
+                    player.fire -= 1
+            server.bullets.remove(bullet)
+
+    return f"{game_state_encoded[:-1]}\n".encode()
+
+
+def grid_update_state(server):
+    return protocol.encode_text_state(server.update_state())
+
+
+def run(update, player_count):
+    server = game_server.GameServer()
+    populate(server, player_count, seed=player_count)
+    states = []
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        states.append(update(server))
+    elapsed = time.perf_counter() - start
+    return elapsed / TICKS, states
+
+
+def main():
+    print(f"{'players':>8} {'all-pairs ms':>13} {'grid ms':>9} {'speedup':>8}")
+    for player_count in (10, 100, 1000):
+        brute_tick, brute_states = run(all_pairs_update_state, player_count)
+        grid_tick, grid_states = run(grid_update_state, player_count)
+        assert brute_states == grid_states, f"broad-phase changed the results at {player_count} players"
+        print(f"{player_count:>8} {brute_tick * 1000:>13.3f} {grid_tick * 1000:>9.3f} {brute_tick / grid_tick:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
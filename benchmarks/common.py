@@ -0,0 +1,26 @@
+import importlib.util
+import math
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+# the game's modules are imported from the repository root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def load_game_server():
+    # game-server.py is not importable by name, load it from its path
+    spec = importlib.util.spec_from_file_location("game_server", ROOT / "game-server.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def square_field(world, player_count):
+    # sizes the field so player_count ships are as dense as 10 on the 800x800
+    # one, returns its side
+    side = int(800 * math.sqrt(player_count / 10))
+    world.game_field_width = side
+    world.game_field_height = side
+    return side
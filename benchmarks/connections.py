@@ -0,0 +1,110 @@
+# Server CPU spent taking inputs from many connections, with the stream
+# handler (a coroutine per connection reading line by line) against the
+# asyncio.Protocol one. The server runs in a process of its own without its
+# tick loop and only the inputs are timed, once every client is connected.
+# User and system CPU are shown apart: a server that keeps up reads its sockets
+# more often and with less in them, which shows in the kernel's share. The
+# speedup compares both together, what an input costs the server overall.
+#
+#   python benchmarks/connections.py
+import asyncio
+import logging
+import multiprocessing
+import resource
+
+from common import load_game_server
+
+PORT = 8891
+INPUTS = 100
+# inputs every client writes before the clients yield to each other
+BURST = 1
+
+
+def serve(handler, expected, pipe):
+    game_server = load_game_server()
+    logging.disable(logging.CRITICAL)
+
+    async def main():
+        server = game_server.GameServer(handler=handler)
+        listener = asyncio.create_task(server.start('127.0.0.1', PORT))
+        await asyncio.sleep(0.2)
+        pipe.send('ready')
+        # the clients connect, then the inputs start
+        await asyncio.get_running_loop().run_in_executor(None, pipe.recv)
+        start = resource.getrusage(resource.RUSAGE_SELF)
+        pipe.send('go')
+        while server.inputs_received < expected:
+            await asyncio.sleep(0.01)
+        end = resource.getrusage(resource.RUSAGE_SELF)
+        pipe.send((end.ru_utime - start.ru_utime, end.ru_stime - start.ru_stime, server.inputs_received))
+        listener.cancel()
+
+    asyncio.run(main())
+
+
+async def connect(count, binary, protocol):
+    connections = []
+    for _ in range(count):
+        reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+        await reader.readline()
+        if binary:
+            writer.write(protocol.encode_hello())
+        connections.append((reader, writer))
+    return connections
+
+
+async def send_inputs(connections, binary, protocol):
+    for first in range(1, INPUTS + 1, BURST):
+        for _, writer in connections:
+            for sequence in range(first, min(first + BURST, INPUTS + 1)):
+                if binary:
+                    writer.write(protocol.encode_input(1, 0, sequence % 2, sequence))
+                else:
+                    writer.write(f'1,0,{sequence % 2},{sequence}\n'.encode())
+        await asyncio.sleep(0)
+        for _, writer in connections:
+            await writer.drain()
+
+
+def run(handler, count, binary):
+    # server user and system CPU seconds and the inputs it took
+    protocol = load_game_server().protocol
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(handler, count * INPUTS, child))
+    process.start()
+    parent.recv()
+
+    async def drive():
+        loop = asyncio.get_running_loop()
+        connections = await connect(count, binary, protocol)
+        await asyncio.sleep(0.5)
+        parent.send('connected')
+        await loop.run_in_executor(None, parent.recv)
+        await send_inputs(connections, binary, protocol)
+        result = await loop.run_in_executor(None, parent.recv)
+        for _, writer in connections:
+            writer.close()
+        return result
+
+    result = asyncio.run(drive())
+    process.join()
+    return result
+
+
+def main():
+    print('server CPU per input in microseconds, user + system')
+    print(f"{'clients':>8} {'format':>7} {'stream':>14} {'protocol':>14} {'speedup':>8}")
+    for count in (100, 1000, 3000):
+        for binary in (False, True):
+            row = []
+            for handler in ('stream', 'protocol'):
+                user, system, inputs = run(handler, count, binary)
+                row.append((user / inputs * 1e6, system / inputs * 1e6))
+            (stream_user, stream_system), (protocol_user, protocol_system) = row
+            print(f"{count:>8} {'binary' if binary else 'text':>7} "
+                  f"{stream_user:>6.2f} + {stream_system:<5.2f} {protocol_user:>6.2f} + {protocol_system:<5.2f} "
+                  f"{(stream_user + stream_system) / (protocol_user + protocol_system):>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
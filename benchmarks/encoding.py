@@ -0,0 +1,87 @@
+# Cost of turning one tick's state into what every client is sent, with one
+# client per player and as many bullets as players:
+#   - text: the state encoded by appending to a string against a list joined once
+#   - binary: the shared delta copied into one bytes object per client with its
+#     input ack, against handing every client the same delta next to its ack
+#
+#   python benchmarks/encoding.py
+import random
+import time
+
+from common import square_field  # puts the repository root on sys.path
+import protocol
+from world import World
+
+REPEATS = 50
+
+
+def concatenated_text_state(state):
+    # the += encoder this replaced, kept here as the reference
+    players, bullets = state
+    game_state_encoded = ''
+    for player_id, x, y, life_point in players:
+        game_state_encoded += f'{player_id},{x},{y},{life_point},'
+
+    game_state_encoded += f':'
+
+    if len(bullets) == 0:
+        game_state_encoded += ","
+
+    for owner, seq, is_active, x, y in bullets:
+        game_state_encoded += f'{owner}_{seq}, {int(is_active)}, {x}, {y},'
+
+    return f"{game_state_encoded[:-1]}\n".encode()
+
+
+def make_state(player_count):
+    rng = random.Random(player_count)
+    world = World()
+    side = square_field(world, player_count)
+    for i in range(player_count):
+        world.add_player(world.new_player(rng.uniform(0, side), rng.uniform(0, side), i))
+    for player in world.players:
+        world.spawn_bullet(player, 1)
+    return world.step({})
+
+
+def per_tick(encode, state):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        encode(state)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    print('ms per tick')
+    print(f"{'players':>8} {'text +=':>9} {'text join':>10} {'speedup':>8} {'binary copy':>12} {'binary shared':>14} {'speedup':>8}")
+    for player_count in (10, 100, 1000, 3000):
+        state = make_state(player_count)
+        assert concatenated_text_state(state) == protocol.encode_text_state(state)
+        acks = [protocol.encode_input_ack(i, 1, x, y, 0, 0) for i, x, y, _ in state[0]]
+
+        def text_concatenated(state):
+            message = concatenated_text_state(state)
+            return [message for _ in acks]
+
+        def text_joined(state):
+            message = protocol.encode_text_state(state)
+            return [(message,) for _ in acks]
+
+        def binary_copied(state):
+            delta = protocol.SnapshotSender().encode(1, protocol.make_snapshot(state))
+            return [delta + ack for ack in acks]
+
+        def binary_shared(state):
+            delta = protocol.SnapshotSender().encode(1, protocol.make_snapshot(state))
+            return [(delta, ack) for ack in acks]
+
+        text_old = per_tick(text_concatenated, state)
+        text_new = per_tick(text_joined, state)
+        binary_old = per_tick(binary_copied, state)
+        binary_new = per_tick(binary_shared, state)
+        print(f"{player_count:>8} {text_old * 1000:>9.3f} {text_new * 1000:>10.3f} {text_old / text_new:>7.1f}x "
+              f"{binary_old * 1000:>12.3f} {binary_new * 1000:>14.3f} {binary_old / binary_new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Tick cost of the object simulation against the numpy entity store as the
+# number of bullets in flight grows.
+#
+#   python benchmarks/entity_store.py
+import random
+import time
+
+from common import load_game_server, square_field
+
+game_server = load_game_server()
+
+TICKS = 20
+PLAYERS = 100
+
+
+def populate(server, bullet_count, seed):
+    rng = random.Random(seed)
+    side = square_field(server, PLAYERS)
+    for i in range(PLAYERS):
+        player = server.new_player(rng.uniform(0, side), rng.uniform(0, side), i, None)
+        player.speed_x = rng.choice([-1, 0, 1]) * server.thrust
+        player.speed_y = rng.choice([-1, 0, 1]) * server.thrust
+        server.add_player(player)
+    for i in range(bullet_count):
+        shooter = server.players[rng.randrange(PLAYERS)]
+        shooter.x = rng.uniform(0, side)
+        shooter.y = rng.uniform(0, side)
+        server.spawn_bullet(shooter, i)
+
+
+def run(server_class, bullet_count):
+    server = server_class()
+    populate(server, bullet_count, seed=bullet_count)
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        server.update_state()
+    return (time.perf_counter() - start) / TICKS
+
+
+def main():
+    print(f"{'bullets':>8} {'objects ms':>11} {'numpy ms':>9} {'speedup':>8}")
+    for bullet_count in (100, 1000, 10000):
+        object_tick = run(game_server.GameServer, bullet_count)
+        numpy_tick = run(game_server.VectorizedGameServer, bullet_count)
+        print(f"{bullet_count:>8} {object_tick * 1000:>11.3f} {numpy_tick * 1000:>9.3f} {object_tick / numpy_tick:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
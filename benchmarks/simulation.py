@@ -0,0 +1,58 @@
+# Simulation cost alone: World.step driven by random inputs, no sockets,
+# encoding or rendering. Ship density stays that of 10 ships on the 800x800
+# field, every ship sends an input a quarter of the ticks like a client
+# holding a key does at 20 ticks/s.
+#
+#   python benchmarks/simulation.py
+import random
+import time
+
+start = time.perf_counter()
+from common import square_field  # puts the repository root on sys.path
+from world import World
+startup = time.perf_counter() - start
+
+TICKS = 2000
+INPUT_CHANCE = 0.25
+FIRE_CHANCE = 0.1
+
+
+def populate(world, player_count, rng):
+    side = square_field(world, player_count)
+    for i in range(player_count):
+        player = world.new_player(rng.uniform(0, side), rng.uniform(0, side), i)
+        # hits still land, but nobody dies and leaves
+        player.life_point = 10 ** 9
+        world.add_player(player)
+
+
+def run(player_count, ticks):
+    rng = random.Random(player_count)
+    world = World()
+    populate(world, player_count, rng)
+    # drawn up front so only the simulation is timed
+    schedule = []
+    for _ in range(ticks):
+        inputs = {}
+        for player in world.players:
+            if rng.random() < INPUT_CHANCE:
+                inputs[player] = (rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)), int(rng.random() < FIRE_CHANCE))
+        schedule.append(inputs)
+
+    start = time.perf_counter()
+    for inputs in schedule:
+        world.step(inputs)
+    return time.perf_counter() - start, world.bullet_count()
+
+
+def main():
+    print(f"import and setup {startup * 1000:.1f} ms")
+    print(f"{'players':>8} {'ticks/s':>9} {'ms/tick':>8} {'bullets':>8}")
+    for player_count in (10, 100, 1000):
+        ticks = TICKS if player_count < 1000 else TICKS // 10
+        elapsed, bullets = run(player_count, ticks)
+        print(f"{player_count:>8} {ticks / elapsed:>9.0f} {elapsed / ticks * 1000:>8.3f} {bullets:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+import protocol
+
+# bytes a connection may buffer without a complete message in them, like the
+# StreamReader limit the stream handler runs with
+MAX_BUFFER = 64 * 1024
+
+
+# connection handler on asyncio.Protocol callbacks instead of a coroutine per
+# client. Whatever arrived is parsed in one go in data_received, every line or
+# frame in it becomes an input straight away without waking a coroutine per
+# message. The connection is also the writer of its OutboundQueue.
+class ClientConnection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.player = None
+        self.joined = False
+        self.binary = False
+        self.buffer = bytearray()
+        # set while the transport takes more data, drain() waits for it
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.closed = asyncio.Event()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+        self.player = self.server.accept(self)
+
+    def data_received(self, data):
+        self.buffer += data
+        try:
+            if not self.joined:
+                self.hello()
+            if self.joined:
+                if self.binary:
+                    self.read_binary_inputs()
+                else:
+                    self.read_text_inputs()
+        except ValueError as error:
+            logging.warning(f'Player {self.player.id} sent garbage, closing: {error}')
+            self.transport.close()
+            return
+        if len(self.buffer) > MAX_BUFFER:
+            logging.warning(f'Player {self.player.id} overran the input buffer, closing')
+            self.transport.close()
+
+    def hello(self):
+        # the first line either is a hello or already a text input
+        end = self.buffer.find(b'\n')
+        if end < 0:
+            return
+        hello = protocol.decode_hello(bytes(self.buffer[:end + 1]))
+        if hello is None:
+            protocol_version, compression = protocol.TEXT, False
+        else:
+            protocol_version, compression = hello
+            del self.buffer[:end + 1]
+        self.binary = protocol_version != protocol.TEXT
+        self.server.join(self.player, protocol_version, compression)
+        self.joined = True
+
+    def read_text_inputs(self):
+        end = self.buffer.rfind(b'\n')
+        if end < 0:
+            return
+        lines = self.buffer[:end].split(b'\n')
+        del self.buffer[:end + 1]
+        self.server.receive_inputs(self.player, [protocol.decode_text_input(line) for line in lines])
+
+    def read_binary_inputs(self):
+        frames, used = protocol.take_frames(self.buffer, MAX_BUFFER)
+        del self.buffer[:used]
+        inputs = []
+        for message_type, body in frames:
+            if message_type == protocol.MSG_INPUT:
+                inputs.append(protocol.decode_input(body))
+            elif message_type == protocol.MSG_ACK:
+                self.player.snapshots.ack(protocol.decode_ack(body))
+        if inputs:
+            self.server.receive_inputs(self.player, inputs)
+
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+        if self.joined:
+            self.server.disconnect(self.player)
+            logging.info('Client disconnected')
+        else:
+            self.player.outbound.close()
+        self.writable.set()
+        self.closed.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    # the part of asyncio.StreamWriter OutboundQueue uses
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def writelines(self, batch):
+        self.transport.writelines(batch)
+
+    async def drain(self):
+        await self.writable.wait()
+        if self.transport.is_closing():
+            raise ConnectionResetError('Connection lost')
+
+    def close(self):
+        self.transport.close()
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
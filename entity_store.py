@@ -0,0 +1,216 @@
+try:
+    import numpy as np
+except ImportError:
+    # the store is optional, GameServer keeps working on plain objects without numpy
+    np = None
+
+import protocol
+
+PLAYER_COLUMNS = {
+    'player_ids': 'int64',
+    'player_x': 'float64',
+    'player_y': 'float64',
+    'player_speed_x': 'float64',
+    'player_speed_y': 'float64',
+    'player_life': 'int64',
+    'player_fire': 'int64',
+}
+BULLET_COLUMNS = {
+    'bullet_owner': 'int64',
+    'bullet_seq': 'int64',
+    'bullet_x': 'float64',
+    'bullet_y': 'float64',
+    'bullet_speed_y': 'float64',
+}
+# rows of the pairwise tests done at once, bounds their temporary arrays
+BLOCK_SIZE = 256
+
+
+def array_property(column, cast):
+    def getter(view):
+        if view.index is None:
+            return view.detached[column]
+        return cast(getattr(view.store, column)[view.index])
+
+    def setter(view, value):
+        if view.index is None:
+            view.detached[column] = value
+        else:
+            getattr(view.store, column)[view.index] = value
+
+    return property(getter, setter)
+
+
+# stands in for a Player in the connection code, the simulated attributes live
+# in the store's arrays and everything else is a plain attribute. A view that
+# is not (or no longer) in the store keeps its values to itself.
+class PlayerView:
+    __slots__ = ('store', 'index', 'detached', 'id', 'writer', 'protocol_version', 'snapshots', 'outbound', 'inputs', 'shots', 'input_sequence', 'input_tick', 'received_sequence', 'udp_token', 'udp_address', 'departed', 'bullet_direction')
+
+    width = 60
+    height = 75
+
+    x = array_property('player_x', float)
+    y = array_property('player_y', float)
+    speed_x = array_property('player_speed_x', float)
+    speed_y = array_property('player_speed_y', float)
+    life_point = array_property('player_life', int)
+    fire = array_property('player_fire', int)
+
+    def __init__(self, store, x, y, id, writer, inputs):
+        self.store = store
+        self.index = None
+        self.detached = {'player_x': x, 'player_y': y, 'player_speed_x': 0, 'player_speed_y': 0, 'player_life': 3, 'player_fire': 0}
+        self.id = id
+        self.writer = writer
+        self.protocol_version = protocol.TEXT
+        self.snapshots = protocol.SnapshotSender()
+        self.outbound = None
+        self.inputs = inputs
+        self.shots = 0
+        self.input_sequence = 0
+        self.input_tick = 0
+        self.received_sequence = 0
+        self.udp_token = 0
+        self.udp_address = None
+        self.departed = False
+        self.bullet_direction = -1
+
+
+# structure-of-arrays store for the server simulation. Rows are kept packed,
+# removing an entity moves the last row into its place.
+class EntityStore:
+    def __init__(self, capacity=64):
+        if np is None:
+            raise ImportError('EntityStore needs numpy')
+        self.player_count = 0
+        self.bullet_count = 0
+        self.views = []
+        self.views_by_id = {}
+        for column, dtype in PLAYER_COLUMNS.items():
+            setattr(self, column, np.zeros(capacity, dtype))
+        for column, dtype in BULLET_COLUMNS.items():
+            setattr(self, column, np.zeros(capacity, dtype))
+
+    def grow(self, columns, needed):
+        for column in columns:
+            array = getattr(self, column)
+            if len(array) < needed:
+                grown = np.zeros(max(needed, len(array) * 2), array.dtype)
+                grown[:len(array)] = array
+                setattr(self, column, grown)
+
+    def add_player(self, view):
+        self.grow(PLAYER_COLUMNS, self.player_count + 1)
+        index = self.player_count
+        self.player_ids[index] = view.id
+        for column, value in view.detached.items():
+            getattr(self, column)[index] = value
+        view.index = index
+        self.views.append(view)
+        self.views_by_id[view.id] = view
+        self.player_count += 1
+
+    def remove_player(self, view):
+        index = view.index
+        view.detached = {column: getattr(self, column)[index].item() for column in view.detached}
+        view.index = None
+        self.views_by_id.pop(view.id, None)
+
+        last = self.player_count - 1
+        if index != last:
+            for column in PLAYER_COLUMNS:
+                array = getattr(self, column)
+                array[index] = array[last]
+            moved = self.views[last]
+            moved.index = index
+            self.views[index] = moved
+        self.views.pop()
+        self.player_count -= 1
+
+    def add_bullet(self, owner, seq, x, y, speed_y):
+        self.grow(BULLET_COLUMNS, self.bullet_count + 1)
+        index = self.bullet_count
+        self.bullet_owner[index] = owner
+        self.bullet_seq[index] = seq
+        self.bullet_x[index] = x
+        self.bullet_y[index] = y
+        self.bullet_speed_y[index] = speed_y
+        self.bullet_count += 1
+
+    def step(self, dt, friction, field_width, field_height, player_width, player_height):
+        # one simulation step over every entity at once, returns the same
+        # (players, bullets) records as GameServer.update_state. Unlike the
+        # object loop all players are tested against where the others stood at
+        # the start of the step, not where the ones before them moved to.
+        n = self.player_count
+        ids = self.player_ids[:n]
+        x = self.player_x[:n]
+        y = self.player_y[:n]
+        speed_x = self.player_speed_x[:n]
+        speed_y = self.player_speed_y[:n]
+        life = self.player_life[:n]
+
+        # prevent player from colliding each other
+        future_x = x + speed_x * dt
+        future_y = y + speed_y * dt
+        blocked = np.zeros(n, bool)
+        for start in range(0, n, BLOCK_SIZE):
+            stop = start + BLOCK_SIZE
+            overlap = ((np.abs(future_x[start:stop, None] - future_x[None, :]) < player_width)
+                       & (np.abs(future_y[start:stop, None] - future_y[None, :]) < player_height)
+                       & (ids[start:stop, None] != ids[None, :]))
+            blocked[start:stop] = overlap.any(axis=1)
+        speed_x[blocked] = 0
+        speed_y[blocked] = 0
+
+        x += speed_x * dt
+        y += speed_y * dt
+
+        # prevent player from going off screen
+        for position, speed, limit in ((x, speed_x, field_width - player_width), (y, speed_y, field_height - player_height)):
+            outside = position < 0
+            position[outside] = 0
+            speed[outside] = 0
+            outside = position > limit
+            position[outside] = limit
+            speed[outside] = 0
+
+        # add friction
+        speed_x -= np.sign(speed_x) * friction
+        speed_y -= np.sign(speed_y) * friction
+
+        # bullet hits, against the players' new positions
+        m = self.bullet_count
+        owner = self.bullet_owner[:m]
+        bullet_x = self.bullet_x[:m]
+        bullet_y = self.bullet_y[:m]
+        bullet_speed_y = self.bullet_speed_y[:m]
+        future_bullet_y = bullet_y + bullet_speed_y * dt
+        active = np.ones(m, bool)
+        for start in range(0, n, BLOCK_SIZE):
+            stop = start + BLOCK_SIZE
+            hit = ((np.abs(x[start:stop, None] - bullet_x[None, :]) <= player_width)
+                   & (np.abs(y[start:stop, None] - future_bullet_y[None, :]) <= player_height)
+                   & (ids[start:stop, None] != owner[None, :]))
+            life[start:stop] -= hit.sum(axis=1)
+            active &= ~hit.any(axis=0)
+
+        bullet_y += bullet_speed_y * dt
+        active &= (bullet_x >= 0) & (bullet_x <= field_width) & (bullet_y >= 0) & (bullet_y <= field_height)
+
+        players = list(zip(ids.tolist(), x.tolist(), y.tolist(), life.tolist()))
+        bullets = list(zip(owner.tolist(), self.bullet_seq[:m].tolist(), active.tolist(), bullet_x.tolist(), bullet_y.tolist()))
+
+        if not active.all():
+            for owner_id in owner[~active].tolist():
+                view = self.views_by_id.get(owner_id)
+                if view is not None:
+                    self.player_fire[view.index] -= 1
+            kept = int(active.sum())
+            for column in BULLET_COLUMNS:
+                array = getattr(self, column)
+                array[:kept] = array[:m][active]
+            self.bullet_count = kept
+
+        return players, bullets
@@ -1,26 +1,50 @@
 # Example file showing a basic pygame "game loop"
+import argparse
 import asyncio
 import threading
 import logging
+import time
 from dataclasses import dataclass
 
 import pygame
 
+import protocol
+import udp
+from interpolation import Frame, SnapshotBuffer
+from prediction import Predictor
+
 # pygame setup
 pygame.init()
 screen = pygame.display.set_mode((800, 800))
 clock = pygame.time.Clock()
 running = True
 
+SHIP_IMAGES = ("images/ship1.png", "images/ship2.png", "images/ship3.png")
+ENEMY_IMAGES = ("images/e-ship1.png", "images/e-ship2.png", "images/e-ship3.png")
+BULLET_IMAGES = ("images/bullet.png",)
+
+# sprite variants by (files, scale, angle), every one is loaded, scaled and
+# converted once and its surfaces shared by all entities that show it
+sprite_cache = {}
+
 def prepare_image(file_name, scale, angle):
     img = pygame.image.load(file_name)
-    img.convert()
     img = pygame.transform.rotozoom(img, angle, scale)
 
-    img.set_colorkey("black")
+    # the sprites sit on opaque black, a display format copy with a colorkey
+    # blits without conversion
+    img = img.convert()
+    img.set_colorkey("black", pygame.RLEACCEL)
 
     return img
 
+def load_sprites(image_files, scale, angle):
+    key = (tuple(image_files), scale, angle)
+    images = sprite_cache.get(key)
+    if images is None:
+        images = sprite_cache[key] = tuple(prepare_image(file_name, scale, angle) for file_name in image_files)
+    return images
+
 class Console:
     def __init__(self, screen):
         self.x = 0
@@ -32,35 +56,49 @@ class Console:
         self.font = pygame.font.SysFont(None, 22)
         self.screen = screen
         self.visible = True
+        self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
+
+        # draw transparent background with alpha 128
+        # pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height), 0, pygame.BLEND_RGBA_MULT)
+
+        self.background = pygame.Surface((self.width, self.height))  # the size of your rect
+        self.background.set_alpha(80)  # alpha level
+        self.background.fill(self.color)  # this fills the entire surface
+
+        # rendered once per text, None until the next draw
+        self.text_surface = None
+        # the console looks different from what is on screen
+        self.dirty = True
 
     def hide(self):
+        self.dirty = self.dirty or self.visible
         self.visible = False
 
     def show(self):
+        self.dirty = self.dirty or not self.visible
         self.visible = True
 
     def draw(self):
+        self.dirty = False
         if not self.visible:
             return
 
-        # draw transparent background with alpha 128
-        # pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height), 0, pygame.BLEND_RGBA_MULT)
-
-        s = pygame.Surface((self.width, self.height))  # the size of your rect
-        s.set_alpha(80)  # alpha level
-        s.fill(self.color)  # this fills the entire surface
-        screen.blit(s, (self.x, self.y))
+        screen.blit(self.background, (self.x, self.y))
 
         # pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
 
-        text = self.font.render(self.text, True, "white")
+        if self.text_surface is None:
+            self.text_surface = self.font.render(self.text, True, "white")
 
-        # draw transparent text
-        text.set_alpha(190)
-        screen.blit(text, (self.x + 10, self.y + 10))
+            # draw transparent text
+            self.text_surface.set_alpha(190)
+        screen.blit(self.text_surface, (self.x + 10, self.y + 10))
 
     def log(self, text):
-        self.text = text
+        if text != self.text:
+            self.text = text
+            self.text_surface = None
+            self.dirty = True
 
     def update(self):
         pass
@@ -77,9 +115,7 @@ class Player:
 
         self.image_index = 0
 
-        self.images = []
-        for file_name in image_files:
-            self.images.append(prepare_image(file_name, scale, angle))
+        self.images = load_sprites(image_files, scale, angle)
 
         self.image = self.images[self.image_index]
         self.rect = self.image.get_rect()
@@ -87,9 +123,12 @@ class Player:
         self.numBullet = 0
         self.life_point = 3
         self.is_alive = True
+        # set by the network thread for the player's own ship when the server
+        # speaks the binary protocol
+        self.predictor = None
 
     def draw(self):
-        self.screen.blit(self.image, self.rect)
+        return self.screen.blit(self.image, self.rect)
 
     def update(self):
         self.image_index += 1
@@ -120,9 +159,7 @@ class Bullet:
 
         self.image_index = 0
 
-        self.images = []
-        for file_name in image_files:
-            self.images.append(prepare_image(file_name, scale, angle))
+        self.images = load_sprites(image_files, scale, angle)
 
         self.image = self.images[self.image_index]
         self.rect = self.image.get_rect()
@@ -131,9 +168,9 @@ class Bullet:
 
     def draw(self):
         if not self.is_active:
-            return
+            return None
 
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
+        return pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
 
     def update(self):
         self.image_index += 1
@@ -144,6 +181,11 @@ class Bullet:
         self.rect.x = self.x
         self.rect.y = self.y
 
+# every input gives the ship one push, a held key repeats it this often
+INPUT_REPEAT = 0.2
+# an idle player still sends this often so the server hears from it
+INPUT_KEEPALIVE = 1.0
+
 @dataclass
 class EventsData:
     down_key: bool
@@ -151,160 +193,233 @@ class EventsData:
     left_key: bool
     right_key: bool
     fire_key: bool
-
-async def send_events(eventsData, writer):
+    # set by the network thread, called from the pygame loop when a key changed
+    wakeup: object = None
+
+    def changed(self):
+        if self.wakeup is not None:
+            self.wakeup()
+
+async def send_events(eventsData, writer, predictor):
+    # sends as soon as the keys change, repeats held keys and otherwise only
+    # keeps the connection alive
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    eventsData.wakeup = lambda: loop.call_soon_threadsafe(changed.set)
+
+    sequence = 0
+    last_input = None
+    last_sent = None
     while running:
+        changed.clear()
         move_x = -1 if eventsData.left_key else 1 if eventsData.right_key else 0
         move_y = -1 if eventsData.up_key else 1 if eventsData.down_key else 0
         fire = 1 if eventsData.fire_key else 0
 
-        message = f"{move_x},{move_y},{fire}\n"
-        # fake send data
-        # await asyncio.sleep(1)
+        current_input = (move_x, move_y, fire)
+        interval = INPUT_KEEPALIVE if current_input == (0, 0, 0) else INPUT_REPEAT
+        if current_input != last_input or loop.time() - last_sent >= interval:
+            sequence += 1
+            if predictor is not None:
+                message = protocol.encode_input(move_x, move_y, fire, sequence)
+                predictor.queue(sequence, move_x, move_y)
+            else:
+                message = f"{move_x},{move_y},{fire},{sequence}\n".encode()
+            # fake send data
+            # await asyncio.sleep(1)
+
+            writer.write(message)
+            await writer.drain()
+            last_input = current_input
+            last_sent = loop.time()
+
+            logging.info(f"send_events coroutine: sent {message}")
+
+        try:
+            await asyncio.wait_for(changed.wait(), last_sent + interval - loop.time())
+        except asyncio.TimeoutError:
+            pass
+
+async def predict(predictor):
+    # local ticks of the own ship, on the server's schedule
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while running:
+        predictor.step()
+        next_tick += predictor.dt
+        await asyncio.sleep(max(0, next_tick - loop.time()))
+
+async def bind_udp(player, writer, port, token, on_frames):
+    # asks for the snapshots on a UDP socket of our own, again and again
+    # until the first one arrives there, they keep coming over TCP until then
+    loop = asyncio.get_running_loop()
+    host = writer.get_extra_info("peername")[0]
+    transport, listener = await loop.create_datagram_endpoint(lambda: udp.SnapshotListener(on_frames), remote_addr=(host, port))
+    for _ in range(20):
+        if listener.received or not running:
+            break
+        transport.sendto(protocol.encode_udp_bind(player.id, token))
+        await asyncio.sleep(0.25)
+    logging.info(f"UDP snapshots: {listener.received > 0}")
+    return transport
+
+async def receive_events(player, frames, reader, writer, binary, use_udp):
+    snapshots = protocol.SnapshotReceiver()
+    # latest known state, every snapshot publishes a copy of it as a Frame,
+    # the render thread never sees these dicts
+    player_positions = {}
+    bullet_positions = {}
+    lives = {}
+    udp_task = None
+
+    def handle(message_type, body):
+        if message_type == protocol.MSG_INPUT_ACK:
+            player.predictor.reconcile(*protocol.decode_input_ack(body))
+        elif message_type == protocol.MSG_SNAPSHOT:
+            changes = snapshots.receive(body)
+            if changes is not None:
+                tick, players_data, bullets_data, removed_players, removed_bullets = changes
+                writer.write(protocol.encode_ack(tick))
+                apply(players_data, bullets_data, removed_players, removed_bullets)
+
+    def handle_datagram(datagram_frames):
+        # a datagram overtaken by a newer snapshot goes whole, its input ack too
+        message_type, body = datagram_frames[0]
+        if message_type == protocol.MSG_SNAPSHOT and protocol.snapshot_tick(body) <= snapshots.tick:
+            return
+        for message_type, body in datagram_frames:
+            handle(message_type, body)
+
+    def apply(players_data, bullets_data, removed_players, removed_bullets):
+        for player_id, x, y, life_point in players_data:
+            if player_id != player.id and life_point <= 0:
+                player_positions.pop(player_id, None)
+                lives.pop(player_id, None)
+            else:
+                player_positions[player_id] = (x, y)
+                lives[player_id] = life_point
 
-        writer.write(message.encode())
-        await writer.drain()
-        await asyncio.sleep(0.2)
+        for bullet_id, bullet_status, x, y in bullets_data:
+            if bullet_status == 0:
+                bullet_positions.pop(bullet_id, None)
+            else:
+                bullet_positions[bullet_id] = (x, y)
+
+        for player_id in removed_players:
+            player_positions.pop(player_id, None)
+            lives.pop(player_id, None)
+
+        for bullet_id in removed_bullets:
+            bullet_positions.pop(bullet_id, None)
 
-        logging.info(f"send_events coroutine: sent {message}")
+        frames.push(Frame(time.monotonic(), dict(player_positions), dict(bullet_positions), dict(lives)))
 
-async def receive_events(player, other_players, bullets, reader):
     while running:
         # fake_data = "0,50,200,1,400,600,2,25,550".encode()
-        message = await reader.readline()
+        if binary:
+            message_type, body = await protocol.read_frame(reader)
+            if message_type == protocol.MSG_UDP_OFFER:
+                if use_udp and udp_task is None:
+                    udp_task = asyncio.create_task(bind_udp(player, writer, *protocol.decode_udp_offer(body), handle_datagram))
+                continue
+            handle(message_type, body)
+        else:
+            message = await reader.readline()
+            logging.info(f"message received: {message.decode()}")
+            players_data, bullets_data = protocol.decode_text_state(message)
+            apply(players_data, bullets_data, (), ())
 
         # fake receive data
         # await asyncio.sleep(1)
         # message = fake_data
 
-        logging.info(f"message received: {message.decode()}")
-        pre_data_parts = message.decode().split(":")
-        data_parts= pre_data_parts[0].split(",")
-        data_parts = data_parts[:-1]
-        bullet_parts = pre_data_parts[1].split(",")
-        bullet_parts[-1] = bullet_parts[-1][:-1]
-        print(data_parts, bullet_parts)
-
-        for i in range(0, len(data_parts), 4):
-            player_id = int(data_parts[i])
-            if player_id == player.id:
-                player.x = float(data_parts[i+1])
-                player.y = float(data_parts[i+2])
-                player.life_point = int(data_parts[i + 3])
-
-            else:
-                check = False
-                for other_player in other_players:
-                    if player_id == other_player.id:
-                        other_player.x = float(data_parts[i+1])
-                        other_player.y = float(data_parts[i+2])
-                        other_player.life_point = int(data_parts[i + 3])
-                        check = True
-                        break
-                if not check:
-                    other_player = Player(screen, ["images/e-ship1.png", "images/e-ship2.png", "images/e-ship3.png"], 0.25, 0)
-                    other_player.id = player_id
-                    other_players.append(other_player)
-                    other_players[-1].x = float(data_parts[i+1])
-                    other_players[-1].y = float(data_parts[i+2])
-                    other_player.life_point = int(data_parts[i + 3])
-
-        if len(bullet_parts) != 1:
-            for i in range(0, len(bullet_parts), 4):
-                bullet_id = bullet_parts[i]
-                bullet_status = int(bullet_parts[i + 1])
-                # print(bullet_status)
-                if bullet_status == 0:
-                    print("Yes")
-                    for bullet in bullets:
-                        if bullet.id == bullet_id:
-                            bullets.remove(bullet)
-                else:
-                    have_bullet = False
-                    for bullet in bullets:
-                        if bullet.id == bullet_id:
-                            bullet.x = float(bullet_parts[i + 2])
-                            bullet.y = float(bullet_parts[i + 3])
-                            have_bullet = True
-                            break
-                    if not have_bullet:
-                        bullet = Bullet(screen, ['images/bullet.png'], 0.25, 0, bullet_id)
-                        bullet.x = float(bullet_parts[i + 2])
-                        bullet.y = float(bullet_parts[i + 3])
-                        bullet.speed_y = -1
-                        bullets.append(bullet)
-                # if player_id == player.id:
-                #     print(1)
-                #     if player.numBullet < 3:
-                #         print(2)
-                #         bullet = Bullet(screen, ['images/bullet.png'], 0.25, 0, player_id)
-                #         bullet.x = float(bullet_parts[i + 1])
-                #         bullet.y = float(bullet_parts[i + 2])
-                #         bullet.speed_y = -1
-                #         bullets.append(bullet)
-                #         player.numBullet += 1
-                # else:
-                #     for other_player in other_players:
-                #         if player_id == other_player.id:
-                #             print(3)
-                #             if other_player.numBullet < 3:
-                #                 print(4)
-                #                 bullet = Bullet(screen, ['images/bullet.png'], 0.25, 0, player_id)
-                #                 bullet.x = float(bullet_parts[i + 1])
-                #                 bullet.y = float(bullet_parts[i + 2])
-                #                 bullet.speed_y = -1
-                #                 bullets.append(bullet)
-                #                 other_player.numBullet += 1
-
         # await asyncio.sleep(0.05)
 
-async def data_exchange(player, eventsData, other_players, bullets):
+async def data_exchange(player, eventsData, frames, use_udp, compress):
     reader, writer = await asyncio.open_connection("localhost", 8888)
 
     initial_data = await reader.readline()
     logging.info(f"initial data received: {initial_data.decode()}")
-    data_parts=initial_data.decode().split(":")
-    player.id = int(data_parts[1])
-
-    send_events_task = asyncio.create_task(send_events(eventsData, writer))
-    receive_events_task = asyncio.create_task(receive_events(player, other_players, bullets, reader))
-
-    await asyncio.gather(send_events_task, receive_events_task)
+    player.id, server_version, tick_rate, compression = protocol.decode_handshake(initial_data)
+
+    # switch to the binary protocol when the server speaks it, the own ship
+    # is then predicted locally
+    binary = server_version == protocol.PROTOCOL_VERSION
+    compression = compress and compression
+    tasks = []
+    if binary or compression:
+        writer.write(protocol.encode_hello(server_version if binary else protocol.TEXT, compression))
+        await writer.drain()
+    if compression:
+        decompressor = protocol.Decompressor(reader)
+        reader = decompressor.reader
+        tasks.append(decompressor.task)
+    if binary:
+        player.predictor = Predictor(tick_rate)
+        tasks.append(asyncio.create_task(predict(player.predictor)))
+
+    tasks.append(asyncio.create_task(send_events(eventsData, writer, player.predictor)))
+    tasks.append(asyncio.create_task(receive_events(player, frames, reader, writer, binary, use_udp)))
+
+    # with the snapshots on UDP nothing may come over TCP anymore, so the
+    # receive loop is stopped once the sender saw running go off
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    writer.close()
+    for task in done:
+        task.result()
 
     print("data_exchange coroutine finished")
 
-def data_exchange_thread_func(player, eventsData, other_players, bullets):
+def data_exchange_thread_func(player, eventsData, frames, use_udp, compress):
     global running
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(data_exchange(player, eventsData, other_players, bullets))
+    loop.run_until_complete(data_exchange(player, eventsData, frames, use_udp, compress))
 
     loop.close()
 
     print("data_exchange thread finished")
 
-def main():
+def main(full_redraw=False, use_udp=True, compress=False):
+    # without full_redraw only the rects sprites were drawn at and the
+    # console when it changes are drawn again and put on screen. With use_udp
+    # snapshots come over UDP when the server offers it, with compress the TCP
+    # stream is compressed when the server offers that.
     global running
 
-    other_players = []
+    # sprites of remote ships and bullets by id, only the render loop touches
+    # them and keeps them in step with the frames the network thread publishes
+    other_players = {}
+
+    for image_files in (SHIP_IMAGES, ENEMY_IMAGES, BULLET_IMAGES):
+        load_sprites(image_files, 0.25, 0)
 
-    player = Player(screen, ["images/ship1.png", "images/ship2.png", "images/ship3.png"], 0.25, 0)
+    player = Player(screen, SHIP_IMAGES, 0.25, 0)
     console = Console(screen)
-    bullets = []
+    bullets = {}
+    # what the network thread received, drawn a little behind the snapshots
+    # so motion can be interpolated between them
+    frames = SnapshotBuffer()
 
     eventsData = EventsData(False, False, False, False, False)
 
     # create data exchange thread
-    data_exchange_thread = threading.Thread(target=data_exchange_thread_func, args=(player, eventsData, other_players, bullets))
+    data_exchange_thread = threading.Thread(target=data_exchange_thread_func, args=(player, eventsData, frames, use_udp, compress))
     data_exchange_thread.start()
 
+    # rects the sprites were drawn at last frame
+    drawn = []
+
     while running:
         # poll for events
         # pygame.QUIT event means the user clicked X to close your window
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+                eventsData.changed()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_UP:
                     eventsData.up_key = True
@@ -322,6 +437,7 @@ def main():
                         console.hide()
                     else:
                         console.show()
+                eventsData.changed()
 
             elif event.type == pygame.KEYUP:
                 if event.key == pygame.K_UP:
@@ -334,31 +450,65 @@ def main():
                     eventsData.right_key = False
                 elif event.key == pygame.K_SPACE:
                     eventsData.fire_key = False
+                eventsData.changed()
 
 
-        # fill the screen with a color to wipe away anything from last frame
-        screen.fill("black")
+        if full_redraw:
+            # fill the screen with a color to wipe away anything from last frame
+            screen.fill("black")
+        else:
+            # wipe only the sprites of last frame, the rest is black already
+            for rect in drawn:
+                screen.fill("black", rect)
+        erased = drawn
+        # (sprite, rect) drawn this frame
+        sprites = []
+
+        now = time.monotonic()
+        frame = frames.sample(now)
+        if frame is None:
+            frame = Frame(now, {}, {}, {})
+
+        # sprites come and go with the frame
+        for bullet_id in [bullet_id for bullet_id in bullets if bullet_id not in frame.bullets]:
+            del bullets[bullet_id]
+        for player_id in [player_id for player_id in other_players if player_id not in frame.players]:
+            del other_players[player_id]
 
         # draw other players
-        
-        bullet_del = False
-
-        for bullet in bullets:
+        for bullet_id, (x, y) in frame.bullets.items():
+            bullet = bullets.get(bullet_id)
+            if bullet is None:
+                bullet = bullets[bullet_id] = Bullet(screen, BULLET_IMAGES, 0.25, 0, bullet_id)
+                bullet.speed_y = -1
+            bullet.x, bullet.y = x, y
             bullet.update()
-            bullet.draw()
+            rect = bullet.draw()
+            if rect is not None:
+                sprites.append((bullet, rect))
 
-        # bullets = [bullet for bullet in bullets if bullet.is_active]
-
-        for other_player in other_players:
+        for player_id, (x, y) in frame.players.items():
+            if player_id == player.id:
+                continue
+            other_player = other_players.get(player_id)
+            if other_player is None:
+                other_player = other_players[player_id] = Player(screen, ENEMY_IMAGES, 0.25, 0)
+                other_player.id = player_id
+            other_player.x, other_player.y = x, y
+            other_player.life_point = frame.lives[player_id]
             other_player.update()
-            other_player.draw()
-            if other_player.life_point == 0:
-                other_players.remove(other_player)
+            sprites.append((other_player, other_player.draw()))
 
 
-        if player.id is not None:
+        # the own ship is drawn where it is predicted to be, not playout delay ago
+        player.life_point = frame.lives.get(player.id, player.life_point)
+        position = player.predictor.position(now) if player.predictor is not None else None
+        if position is None:
+            position = frame.players.get(player.id)
+        if position is not None:
+            player.x, player.y = position
             player.update()
-            player.draw()
+            sprites.append((player, player.draw()))
             if player.life_point == 0:
                 player.is_alive = False
 
@@ -367,10 +517,25 @@ def main():
             console.log(f"Player x: {int(player.x)}, y: {int(player.y)}, life_point: {player.life_point}")
         else:
             console.log("You are DEAD")
-        console.draw()
+        drawn = [rect for _, rect in sprites]
 
-        # flip() the display to put your work on screen
-        pygame.display.flip()
+        if full_redraw:
+            console.draw()
+
+            # flip() the display to put your work on screen
+            pygame.display.flip()
+        else:
+            updated = erased + drawn
+            # the console is see-through, so it is put together again from
+            # black, the sprites under it and itself whenever any of them changed
+            if console.dirty or console.rect.collidelist(updated) != -1:
+                screen.fill("black", console.rect)
+                for sprite, rect in sprites:
+                    if console.rect.colliderect(rect):
+                        sprite.draw()
+                console.draw()
+                updated.append(console.rect)
+            pygame.display.update(updated)
 
         clock.tick(60)  # limits FPS to 60
 
@@ -382,4 +547,13 @@ if __name__ == "__main__":
     logging.basicConfig(format=format, level=logging.ERROR,
                         datefmt="%F-%H-%M-%S")
 
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full-redraw", action="store_true",
+                        help="clear and flip the whole screen every frame instead of updating dirty rects")
+    parser.add_argument("--tcp-only", action="store_true",
+                        help="take the snapshots over TCP even when the server offers UDP")
+    parser.add_argument("--compress", action="store_true",
+                        help="ask the server to compress what it sends over TCP")
+    args = parser.parse_args()
+
+    main(args.full_redraw, not args.tcp_only, args.compress)
\ No newline at end of file
@@ -1,186 +1,585 @@
+import argparse
+import collections
+import multiprocessing
 import random
+import secrets
+import socket
+import time
 
 import asyncio
 import logging
-from dataclasses import dataclass
-
-@dataclass
-class Player:
-    x: float
-    y: float
-    id: int
-    writer: asyncio.StreamWriter
-    
-    speed_x: float = 0
-    speed_y: float = 0
-    fire: int = 0
-    width: float = 60
-    height: float = 75
-    life_point: int = 3
-
-class Bullet:
-    x: float
-    y: float
-    player_id: int
-    id: int
-    
-    is_active: bool = True
-    width: float = 10
-    height: float = 10
-    speed_y: int = -1
-
-
-
-class GameServer:
-    def __init__(self):
-        self.players = []
-        self.bullets = []
-        self.game_field_width = 800
-        self.game_field_height = 800
-        self.acceleration = 0.1
-        self.player_width = 60
-        self.player_height = 75
+from dataclasses import dataclass, field
+
+import metrics
+import protocol
+import recording
+import udp
+from connection import MAX_BUFFER, ClientConnection
+from interest import InterestFilter
+from entity_store import EntityStore, PlayerView
+from outbound import OutboundQueue
+from scheduler import TickScheduler
+from world import Bullet, Ship, World
+
+# inputs a player may queue between two ticks, older ones are dropped
+INPUT_BUFFER_SIZE = 8
+
+def input_buffer():
+    return collections.deque(maxlen=INPUT_BUFFER_SIZE)
+
+# a Ship with its connection
+@dataclass(slots=True, eq=False)
+class Player(Ship):
+    writer: asyncio.StreamWriter = None
+
+    protocol_version: int = protocol.TEXT
+    snapshots: protocol.SnapshotSender = field(default_factory=protocol.SnapshotSender)
+    outbound: OutboundQueue = None
+    inputs: collections.deque = field(default_factory=input_buffer)
+    # newest input applied and the tick it was applied at, echoed to binary clients
+    input_sequence: int = 0
+    input_tick: int = 0
+    # newest input received, older ones are stale
+    received_sequence: int = 0
+    # set once the client took the UDP offer, snapshots then go there
+    udp_token: int = 0
+    udp_address: tuple = None
+    # set by the first disconnect(), the connection's totals are counted once
+    departed: bool = False
+
+
+# the World served over the network on a fixed tick
+class GameServer(World):
+    def __init__(self, interest_radius=None, tick_rate=20, seed=None, udp_port=None, udp_impairment=None, handler='stream',
+                 compression_level=6):
+        super().__init__(tick_rate)
+        self.scheduler = TickScheduler(tick_rate)
+        self.next_player_id = 0
+        # binary clients only receive entities this close to their ship, None sends everything
+        self.interest_radius = interest_radius
+        # ticks a client may go without taking a snapshot before it is flagged, then evicted
+        self.lagging_ticks = 5
+        self.evict_ticks = 40
+        # how connections are served: 'stream' runs handle_client per
+        # connection, 'protocol' a ClientConnection
+        self.handler = handler
+        # sockets currently served, joined or not
+        self.connections = 0
+        self.inputs_received = 0
+        self.inputs_merged = 0
+        self.inputs_dropped = 0
+        self.inputs_stale = 0
+        # label of this room in the metrics
+        self.name = '0'
+        self.phase_times = {phase: metrics.Histogram() for phase in metrics.PHASES}
+        self.bytes_sent_departed = 0
+        # zlib level for clients that ask for compression, 0 does not offer it
+        self.compression_level = compression_level
+        # compressor bytes in, bytes out and seconds of departed players
+        self.compression_departed = (0, 0, 0.0)
+        # spawn positions, seeded for runs that have to be repeated
+        self.random = random.Random(seed)
+        self.recorder = None
+        # binary clients may take their snapshots over UDP on this port, the
+        # impairment drops and delays them for testing
+        self.udp_port = udp_port
+        self.udp_impairment = udp_impairment
+        self.udp = None
+        self.udp_bytes_sent = 0
+
+    def take_inputs(self):
+        # every player's queued inputs become one per tick: the newest
+        # direction, and a shot if any of them fired
+        tick_inputs = {}
+        for player in self.players:
+            inputs = player.inputs
+            if not inputs:
+                continue
+            x_action, y_action, fire_action, sequence = inputs[-1]
+            if len(inputs) > 1:
+                self.inputs_merged += len(inputs) - 1
+                fire_action = max(message[2] for message in inputs)
+            inputs.clear()
+            player.input_sequence = sequence
+            player.input_tick = self.tick + 1
+            tick_inputs[player] = (x_action, y_action, fire_action)
+        return tick_inputs
+
+    def step(self, steps):
+        # the simulation part of a tick, everything a recording has to reproduce
+        if self.recorder is not None:
+            inputs = [(player.id, message) for player in self.players for message in player.inputs]
+        state = super().step(self.take_inputs(), steps)
+        if self.recorder is not None:
+            self.recorder.tick(self.tick, steps, inputs, state)
+        return state
 
     async def update_and_send_state(self):
+        loop = asyncio.get_running_loop()
         while True:
             if len(self.players) == 0:
+                self.scheduler.reset()
                 await asyncio.sleep(0.1)
                 continue
 
-            logging.info(f'Updating and sending state')
-            game_state_encoded = ''
+            steps = await self.scheduler.wait()
+            work_start = loop.time()
 
-            for player in self.players:
-                # prevent player from colliding each other
-                for other_player in self.players:
-                    if other_player.id != player.id:
-                        future_player_x = player.x + player.speed_x
-                        future_player_y = player.y + player.speed_y
-                        future_other_player_x = other_player.x + other_player.speed_x
-                        future_other_player_y = other_player.y + other_player.speed_y
-                        if abs(future_player_x - future_other_player_x) < self.player_width and abs(future_player_y - future_other_player_y) < self.player_height:
-                            player.speed_x = 0
-                            player.speed_y = 0
-
-
-                player.x += player.speed_x
-                player.y += player.speed_y
-
-                # prevent player from going off screen
-                if player.x < 0:
-                    player.x = 0
-                    player.speed_x = 0
-                elif player.x  > self.game_field_width - self.player_width:
-                    player.x = self.game_field_width - self.player_width
-                    player.speed_x = 0
-                if player.y < 0:
-                    player.y = 0
-                    player.speed_y = 0
-                elif player.y  > self.game_field_height - self.player_height:
-                    player.y = self.game_field_height - self.player_height
-                    player.speed_y = 0
-
-                # add friction
-                if player.speed_x > 0:
-                    player.speed_x -= self.acceleration * 0.5
-                elif player.speed_x < 0:
-                    player.speed_x += self.acceleration * 0.5
-                if player.speed_y > 0:
-                    player.speed_y -= self.acceleration * 0.5
-                elif player.speed_y < 0:
-                    player.speed_y += self.acceleration * 0.5
-
-                #prevent bullet hit the other players
-                for bullet in self.bullets:
-                    if player.id != bullet.player_id:
-                        if abs(player.x - bullet.x) <= self.player_width and abs(player.y - (bullet.y + bullet.speed_y)) <= self.player_height:
-                            bullet.is_active = False
-                            player.life_point -= 1
-                
-                
-                game_state_encoded += f'{player.id},{player.x},{player.y},{player.life_point},'
-            
-            game_state_encoded += f':'
-
-            if len(self.bullets) == 0:
-                game_state_encoded += ","
-
-            for bullet in self.bullets:
-
-                bullet.y += bullet.speed_y
-
-                #prevent bullet out of screen
-                if bullet.x < 0 or bullet.x > self.game_field_width or bullet.y < 0 or bullet.y > self.game_field_height:
-                    bullet.is_active = False
-
-
-                game_state_encoded += f'{bullet.id}, {int(bullet.is_active)}, {bullet.x}, {bullet.y},'
-                    
-                if not bullet.is_active:
-                    for player in self.players:
-                        if bullet.player_id == player.id:
-                            player.fire -= 1
-                    self.bullets.remove(bullet)
-
-                
+            logging.debug('Updating and sending state')
+            state = self.step(steps)
+            simulate_done = loop.time()
 
-            for player in self.players:
-                player.writer.write(f"{game_state_encoded[:-1]}\n".encode())
-                await player.writer.drain()
-                
-            for player in self.players:
-                if player.life_point == 0:
-                    self.players.remove(player)
+            text_message = None
+            snapshot = None
+            interest = None
+            # clients acked up to the same tick get the same delta
+            deltas = {}
+            messages = []
 
-            logging.info(f'State sent: {game_state_encoded}')
-            await asyncio.sleep(0.05)
-    async def handle_client(self, reader, writer):
-        # Get the client's name
+            for player in self.players:
+                if player.protocol_version == protocol.TEXT:
+                    if text_message is None:
+                        text_message = protocol.encode_text_state(state)
+                    messages.append((player, (text_message,)))
+                else:
+                    if snapshot is None:
+                        snapshot = protocol.make_snapshot(state)
+                    if self.interest_radius is not None:
+                        if interest is None:
+                            interest = InterestFilter(snapshot, self.interest_radius)
+                        delta = player.snapshots.encode(self.tick, interest.visible_to(player.id))
+                    else:
+                        baseline_tick = player.snapshots.baseline_tick()
+                        delta = deltas.get(baseline_tick)
+                        if delta is None:
+                            delta = deltas[baseline_tick] = player.snapshots.encode(self.tick, snapshot)
+                        else:
+                            player.snapshots.record(self.tick, snapshot)
+                    # the client's own ship goes along with every snapshot, for its prediction,
+                    # the delta stays the one bytes object every client acked up to its baseline gets
+                    messages.append((player, (delta, protocol.encode_input_ack(
+                        player.input_sequence, self.tick - player.input_tick, player.x, player.y, player.speed_x, player.speed_y))))
+            encode_done = loop.time()
+
+            evicted = []
+            for player, parts in messages:
+                if player.udp_address is not None:
+                    datagram = b''.join(parts)
+                    if len(datagram) <= udp.MAX_DATAGRAM:
+                        self.udp.sendto(datagram, player.udp_address)
+                        self.udp_bytes_sent += len(datagram)
+                        continue
+
+                player.outbound.send_snapshot(parts)
+
+                if player.outbound.closed:
+                    evicted.append(player)
+                elif player.outbound.stalled == self.lagging_ticks:
+                    logging.warning(f'Player {player.id} is falling behind')
+                elif player.outbound.stalled >= self.evict_ticks:
+                    logging.warning(f'Evicting player {player.id}, {player.outbound.dropped} snapshots dropped')
+                    evicted.append(player)
+
+            for player in evicted:
+                self.disconnect(player)
+
+            self.remove_dead()
+            send_done = loop.time()
+
+            if text_message is not None:
+                logging.debug('State sent: %s', text_message)
+            self.phase_times['simulate'].observe(simulate_done - work_start)
+            self.phase_times['encode'].observe(encode_done - simulate_done)
+            self.phase_times['send'].observe(send_done - encode_done)
+            self.scheduler.record(send_done - work_start)
+            if self.scheduler.ticks % 100 == 0:
+                logging.info(f'Ticks: {self.scheduler.summary()}')
+                logging.info(f'Inputs: {self.inputs_received} received, {self.inputs_merged} merged, {self.inputs_dropped} dropped, {self.inputs_stale} stale')
+                compress_input, compress_output, compress_seconds = self.compression()
+                if compress_output:
+                    logging.info(f'Compression: {compress_input} bytes to {compress_output}, ratio {compress_input / compress_output:.1f}, '
+                                 f'{compress_seconds / self.scheduler.ticks * 1000:.3f} ms per tick')
+
+    def new_player(self, x, y, player_id, writer=None):
+        return Player(x, y, player_id, writer=writer)
+
+    def bytes_sent(self):
+        return self.bytes_sent_departed + self.udp_bytes_sent + sum(player.outbound.bytes_sent for player in self.players if player.outbound is not None)
+
+    def compression(self):
+        # compressor bytes in, bytes out and seconds over all connections, departed ones included
+        compress_input, compress_output, compress_seconds = self.compression_departed
+        for player in self.players:
+            outbound = player.outbound
+            if outbound is not None and outbound.compressor is not None:
+                compress_input += outbound.compress_input
+                compress_output += outbound.compress_output
+                compress_seconds += outbound.compress_seconds
+        return compress_input, compress_output, compress_seconds
+
+    def disconnect(self, player):
+        # an evicted player is disconnected again once its socket closes
+        outbound = player.outbound
+        outbound.close()
+        if not player.departed:
+            player.departed = True
+            self.bytes_sent_departed += outbound.bytes_sent
+            compress_input, compress_output, compress_seconds = self.compression_departed
+            self.compression_departed = (compress_input + outbound.compress_input, compress_output + outbound.compress_output,
+                                         compress_seconds + outbound.compress_seconds)
+        if player in self.players:
+            if self.recorder is not None:
+                self.recorder.leave(player.id)
+            self.remove_player(player)
+
+    async def start_udp(self, host='0.0.0.0'):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: udp.SnapshotDatagrams(self), local_addr=(host, self.udp_port))
+        self.udp = transport if self.udp_impairment is None else udp.ImpairedTransport(transport, self.udp_impairment)
+        logging.info(f'Room {self.name} offers snapshots over UDP port {self.udp_port}')
+
+    def bind_udp(self, player_id, token, address):
+        for player in self.players:
+            if player.id == player_id and player.udp_token == token:
+                if player.udp_address is None:
+                    logging.info(f'Player {player_id} takes snapshots over UDP from {address}')
+                player.udp_address = address
+
+    def record(self, path):
+        # log joins, leaves and every tick's inputs to path for replay()
+        self.recorder = recording.Recorder(path, self.tick_rate, self.game_field_width, self.game_field_height, type(self).__name__)
+
+    def accept(self, writer):
+        # the player of a new connection, told its id but not in the game until join()
         logging.error(f'New player connected: {len(self.players)}')
 
         # get random position
-        player = Player(random.randint(0, self.game_field_width), random.randint(0, self.game_field_height), len(self.players), writer)
+        player = self.new_player(self.random.randint(0, self.game_field_width), self.random.randint(0, self.game_field_height), self.next_player_id, writer)
+        self.next_player_id += 1
+
+        player.outbound = OutboundQueue(writer).start()
+        player.outbound.send(protocol.encode_handshake(player.id, self.tick_rate, self.compression_level > 0))
+        return player
+
+    def join(self, player, protocol_version, compression=False):
+        player.protocol_version = protocol_version
+        if compression and self.compression_level > 0:
+            player.outbound.compress(self.compression_level)
+        if protocol_version != protocol.TEXT and self.udp is not None:
+            player.udp_token = secrets.randbits(64)
+            player.outbound.send(protocol.encode_udp_offer(self.udp_port, player.udp_token))
+
+        self.add_player(player)
+        if self.recorder is not None:
+            self.recorder.join(player.id, player.x, player.y)
+
+    def receive_inputs(self, player, messages):
+        # queued for the next tick, an input older than one received before is
+        # stale and the buffer keeps the newest INPUT_BUFFER_SIZE
+        received = player.received_sequence
+        fresh = []
+        for message in messages:
+            sequence = message[3]
+            if sequence:
+                if sequence <= received:
+                    continue
+                received = sequence
+            fresh.append(message)
+        player.received_sequence = received
+        self.inputs_received += len(messages)
+        self.inputs_stale += len(messages) - len(fresh)
+        self.inputs_dropped += max(0, len(player.inputs) + len(fresh) - INPUT_BUFFER_SIZE)
+        player.inputs.extend(fresh)
+
+    async def read_text_inputs(self, reader, message=None):
+        # message is a first line already read, if any
+        if message is None:
+            message = await reader.readline()
+        while message:
+            logging.debug('Player sent: %s', message)
+            yield protocol.decode_text_input(message)
+            message = await reader.readline()
+
+    async def read_binary_inputs(self, reader, player):
+        while True:
+            try:
+                message_type, body = await protocol.read_frame(reader, MAX_BUFFER)
+            except asyncio.IncompleteReadError:
+                return
+            if message_type == protocol.MSG_INPUT:
+                yield protocol.decode_input(body)
+            elif message_type == protocol.MSG_ACK:
+                player.snapshots.ack(protocol.decode_ack(body))
+
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            await self.serve_client(reader, writer)
+        finally:
+            self.connections -= 1
+
+    async def serve_client(self, reader, writer):
+        player = self.accept(writer)
+
+        # the first line either is a hello or already a text input
+        message = await reader.readline()
+        if not message:
+            player.outbound.close()
+            return
+        try:
+            hello = protocol.decode_hello(message)
+        except ValueError as error:
+            logging.warning(f'Player {player.id} sent garbage, closing: {error}')
+            player.outbound.close()
+            return
+        if hello is None:
+            protocol_version, compression = protocol.TEXT, False
+        else:
+            protocol_version, compression = hello
+            message = None
+        if protocol_version == protocol.TEXT:
+            inputs = self.read_text_inputs(reader, message)
+        else:
+            inputs = self.read_binary_inputs(reader, player)
+        self.join(player, protocol_version, compression)
+
+        # Listen for messages from the client, they are applied on the next tick
+        try:
+            async for message in inputs:
+                self.receive_inputs(player, (message,))
+        except ConnectionError:
+            pass
+        except ValueError as error:
+            logging.warning(f'Player {player.id} sent garbage, closing: {error}')
+        finally:
+            # Remove the client from the list of connected clients
+            self.disconnect(player)
+            logging.info(f'Client disconnected')
+
+    async def start(self, host='0.0.0.0', port=8888):
+        if self.handler == 'protocol':
+            loop = asyncio.get_running_loop()
+            server = await loop.create_server(lambda: ClientConnection(self), host, port)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
 
-        writer.write(f"id:{player.id}\n".encode())
-        await writer.drain()
+        async with server:
+            await server.serve_forever()
 
+    async def run(self, host='0.0.0.0', port=8888, metrics_port=None):
+        if self.udp_port is not None:
+            await self.start_udp(host)
+        tasks = [self.start(host, port), self.update_and_send_state()]
+        if metrics_port is not None:
+            tasks.append(metrics.serve([self], port=metrics_port))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+
+
+# same game with the simulation running as vectorized numpy operations over an
+# EntityStore, for worlds with thousands of bullets
+class VectorizedGameServer(GameServer):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.store = EntityStore()
+
+    def new_player(self, x, y, player_id, writer=None):
+        return PlayerView(self.store, x, y, player_id, writer, input_buffer())
+
+    def add_player(self, player):
+        self.store.add_player(player)
         self.players.append(player)
 
-        # Listen for messages from the client and broadcast them to all other clients
-        bullet_count = 0
-        while True:
-            message = (await reader.readline()).decode()
-            if not message:
-                break
-            logging.info(f'Player sent: {message}')
-            x_action, y_action, fire_action = message.split(',')
-            player.speed_x += float(x_action)
-            player.speed_y += float(y_action)
-            if int(fire_action) == 1:
-                bullet_count += 1
-                print(bullet_count)
-                if player.fire < 3:
-                    player.fire += 1
-                    bullet = Bullet()
-                    bullet.id = f"{player.id}_{bullet_count}"
-                    bullet.x = player.x + player.width / 2 - bullet.width / 2
-                    bullet.y = player.y + player.height / 2 - bullet.height / 2
-                    bullet.player_id = player.id
-                    self.bullets.append(bullet)
-
-
-        # Remove the client from the list of connected clients
-        # del self.clients[name]
-        logging.info(f'Client disconnected')
-
-    async def start(self):
-        server = await asyncio.start_server(self.handle_client, '0.0.0.0', 8888)
+    def remove_player(self, player):
+        self.store.remove_player(player)
+        self.players.remove(player)
+
+    def spawn_bullet(self, player, seq):
+        self.store.add_bullet(player.id, seq,
+                              player.x + player.width / 2 - Bullet.width / 2,
+                              player.y + player.height / 2 - Bullet.height / 2,
+                              Bullet.speed * player.bullet_direction)
+
+    def bullet_count(self):
+        return self.store.bullet_count
+
+    def update_state(self):
+        return self.store.step(self.dt, self.acceleration * 0.5 * self.dt,
+                               self.game_field_width, self.game_field_height,
+                               self.player_width, self.player_height)
+
+# one worker process: independent GameServer rooms, each with its own tick
+# loop. New connections join the room with the fewest connections that still
+# has space.
+class RoomHost:
+    def __init__(self, room_count, max_players, server_class=GameServer, **room_options):
+        self.rooms = [server_class(**room_options) for _ in range(room_count)]
+        self.max_players = max_players
+        self.handler = self.rooms[0].handler
+        # connections handed to a room that has not counted them yet
+        self.pending = collections.Counter()
+
+    def pick_room(self):
+        room = min(self.rooms, key=lambda room: room.connections + self.pending[room])
+        if room.connections + self.pending[room] >= self.max_players:
+            return None
+        return room
 
-        async with server:
-            await server.serve_forever()
+    async def handle_client(self, reader, writer):
+        room = self.pick_room()
+        if room is None:
+            logging.warning('All rooms are full, refusing connection')
+            writer.close()
+            return
+        await room.handle_client(reader, writer)
+
+    async def connect(self, sock):
+        room = self.pick_room()
+        if room is None:
+            logging.warning('All rooms are full, refusing connection')
+            sock.close()
+            return
+        loop = asyncio.get_running_loop()
+        # the room counts the connection in connection_made, until then other
+        # sockets of the same burst must not take the slot
+        self.pending[room] += 1
+        try:
+            _, connection = await loop.connect_accepted_socket(lambda: ClientConnection(room), sock)
+        finally:
+            self.pending[room] -= 1
+        await connection.closed.wait()
+
+    async def adopt(self, sock, loads, index):
+        try:
+            if self.handler == 'protocol':
+                await self.connect(sock)
+            else:
+                reader, writer = await asyncio.open_connection(sock=sock)
+                await self.handle_client(reader, writer)
+        finally:
+            with loads.get_lock():
+                loads[index] -= 1
+
+    async def serve_handoffs(self, channel, loads, index, metrics_port=None):
+        # the front door passes accepted sockets over channel as file descriptors
+        loop = asyncio.get_running_loop()
+        channel.setblocking(False)
+
+        def receive():
+            while True:
+                try:
+                    _, fds, _, _ = socket.recv_fds(channel, 1, 1)
+                except BlockingIOError:
+                    return
+                for fd in fds:
+                    loop.create_task(self.adopt(socket.socket(fileno=fd), loads, index))
+
+        loop.add_reader(channel.fileno(), receive)
+        for room in self.rooms:
+            if room.udp_port is not None:
+                await room.start_udp()
+        tasks = [room.update_and_send_state() for room in self.rooms]
+        if metrics_port is not None:
+            tasks.append(metrics.serve(self.rooms, port=metrics_port))
+        await asyncio.gather(*tasks)
+
+
+def run_worker(index, channel, loads, room_count, max_players, server_class, room_options, metrics_port, record):
+    logging.info(f'Worker {index} hosting {room_count} rooms')
+    room_host = RoomHost(room_count, max_players, server_class, **room_options)
+    for room_index, room in enumerate(room_host.rooms):
+        room.name = f'{index}.{room_index}'
+        if room_options.get('seed') is not None:
+            # rooms spawn differently, but the same on every run
+            room.random.seed(f"{room_options['seed']}.{room.name}")
+        if record is not None:
+            room.record(f'{record}.{room.name}')
+        if room.udp_port is not None:
+            # every room has a port of its own, counting up over all workers
+            room.udp_port += index * room_count + room_index
+    asyncio.run(room_host.serve_handoffs(channel, loads, index, metrics_port))
+
+
+async def front_door(host, port, channels, loads, capacity):
+    # accepts every connection and hands it to the worker with the fewest
+    # connections, loads counts them per worker across processes
+    loop = asyncio.get_running_loop()
+    listener = socket.create_server((host, port))
+    listener.setblocking(False)
+    while True:
+        conn, address = await loop.sock_accept(listener)
+        with loads.get_lock():
+            index = min(range(len(channels)), key=lambda i: loads[i])
+            full = loads[index] >= capacity
+            if not full:
+                loads[index] += 1
+        if full:
+            logging.warning(f'All workers are full, refusing {address}')
+        else:
+            socket.send_fds(channels[index], [b'c'], [conn.fileno()])
+        conn.close()
+
+
+def launch(worker_count, room_count, max_players, server_class, room_options, host='0.0.0.0', port=8888, metrics_port=None, record=None):
+    # with metrics on, worker i serves them on metrics_port + i, recordings
+    # go to one file per room, record with the room name appended
+    loads = multiprocessing.Array('i', worker_count)
+    channels = []
+    for index in range(worker_count):
+        channel, worker_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        channels.append(channel)
+        worker_metrics_port = None if metrics_port is None else metrics_port + index
+        multiprocessing.Process(target=run_worker, name=f'worker-{index}', daemon=True,
+                                args=(index, worker_channel, loads, room_count, max_players, server_class, room_options, worker_metrics_port, record)).start()
+
+    asyncio.run(front_door(host, port, channels, loads, room_count * max_players))
+
+
+def replay(path, server_class=None):
+    # runs a recording through the simulation as fast as it goes, without
+    # sockets or the scheduler. Returns the room, the time every tick took,
+    # the hash of the final state and the first tick whose state differs
+    # from the recorded one, None if they all match.
+    header, records = recording.read_recording(path)
+    if server_class is None:
+        server_class = {cls.__name__: cls for cls in (GameServer, VectorizedGameServer)}[header['server_class']]
+    elif server_class.__name__ != header['server_class']:
+        # the two simulations do not round alike, the timings still tell something
+        logging.warning(f"{path} was recorded by {header['server_class']}, replaying it with {server_class.__name__} "
+                        f"will not match it tick for tick")
+    server = server_class(tick_rate=header['tick_rate'])
+    server.game_field_width = header['field_width']
+    server.game_field_height = header['field_height']
+
+    players = {}
+    tick_times = []
+    digest = None
+    diverged = None
+    for record in records:
+        if record[0] == recording.REC_JOIN:
+            _, player_id, x, y = record
+            players[player_id] = server.new_player(x, y, player_id, None)
+            server.add_player(players[player_id])
+        elif record[0] == recording.REC_LEAVE:
+            player = players.pop(record[1])
+            if player in server.players:
+                server.remove_player(player)
+        else:
+            _, tick, steps, inputs, recorded_digest = record
+            for player_id, message in inputs:
+                players[player_id].inputs.append(message)
+            start = time.perf_counter()
+            state = server.step(steps)
+            server.remove_dead()
+            tick_times.append(time.perf_counter() - start)
+            digest = recording.state_hash(state)
+            if diverged is None and digest != recorded_digest:
+                diverged = tick
+    return server, tick_times, digest, diverged
 
-    async def run(self):
-        await asyncio.gather(self.start(), self.update_and_send_state())
 
 if __name__ == '__main__':
     format = "SRV: %(asctime)s: %(message)s"
@@ -188,9 +587,73 @@ if __name__ == '__main__':
                         datefmt="%F-%H-%M-%S")
     logging.info("Program start...")
 
-    game_server = GameServer()
-
-    asyncio.run(game_server.run())
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tick-rate', type=float, default=20,
+                        help='simulation steps per second')
+    parser.add_argument('--numpy', action='store_true',
+                        help='run the simulation vectorized over numpy arrays')
+    parser.add_argument('--interest-radius', type=float, default=None,
+                        help='only send binary clients the entities within this many pixels of their ship')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve Prometheus metrics on 127.0.0.1 at this port, one port per worker')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes sharing the port')
+    parser.add_argument('--rooms', type=int, default=1,
+                        help='independent matches hosted by every worker')
+    parser.add_argument('--max-players', type=int, default=16,
+                        help='connections a room takes before new players go elsewhere')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed the spawn positions')
+    parser.add_argument('--record', default=None,
+                        help='log joins, leaves and inputs of every tick to this file')
+    parser.add_argument('--replay', default=None,
+                        help='run a recording headless as fast as possible and report timings, no server')
+    parser.add_argument('--udp-port', type=int, default=None,
+                        help='offer binary clients their snapshots over UDP, one port per room counting up from this one')
+    parser.add_argument('--udp-loss', type=float, default=0.0,
+                        help='drop this share of the UDP snapshots, for testing')
+    parser.add_argument('--udp-latency', type=float, default=0.0,
+                        help='hold every UDP snapshot back this many seconds, for testing')
+    parser.add_argument('--udp-jitter', type=float, default=0.0,
+                        help='hold UDP snapshots back up to this many seconds more at random, for testing')
+    parser.add_argument('--compression-level', type=int, default=6,
+                        help='zlib level for clients that ask for compressed snapshots, 0 does not offer compression')
+    parser.add_argument('--handler', choices=('stream', 'protocol'), default='stream',
+                        help='serve connections with a StreamReader coroutine each or parse them in asyncio.Protocol callbacks')
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        server_class = VectorizedGameServer if args.numpy else None
+        room, tick_times, digest, diverged = replay(args.replay, server_class)
+        total = sum(tick_times)
+        tick_times.sort()
+        logging.info(f'Replayed {len(tick_times)} ticks of {type(room).__name__} in {total:.3f}s, '
+                     f'{len(tick_times) / total if total else 0:.0f} ticks/s, '
+                     f'mean {total / max(1, len(tick_times)) * 1000:.3f} ms, '
+                     f'p99 {tick_times[int(0.99 * len(tick_times))] * 1000 if tick_times else 0:.3f} ms')
+        logging.info(f'Final state {digest:016x}, {len(room.players)} players, {room.bullet_count()} bullets' if digest is not None else 'No ticks recorded')
+        if diverged is None:
+            logging.info('Every tick matches the recording')
+        else:
+            logging.warning(f'State differs from the recording from tick {diverged}')
+        raise SystemExit(diverged is not None)
+
+    server_class = VectorizedGameServer if args.numpy else GameServer
+    impairment = None
+    if args.udp_loss or args.udp_latency or args.udp_jitter:
+        impairment = udp.Impairment(args.udp_loss, args.udp_latency, args.udp_jitter)
+    room_options = dict(interest_radius=args.interest_radius, tick_rate=args.tick_rate, seed=args.seed,
+                        udp_port=args.udp_port, udp_impairment=impairment, handler=args.handler,
+                        compression_level=args.compression_level)
+
+    if args.workers == 1 and args.rooms == 1:
+        game_server = server_class(**room_options)
+        if args.record is not None:
+            game_server.record(args.record)
+        asyncio.run(game_server.run(port=args.port, metrics_port=args.metrics_port))
+    else:
+        launch(args.workers, args.rooms, args.max_players, server_class, room_options, port=args.port, metrics_port=args.metrics_port, record=args.record)
 
     # loop = asyncio.get_event_loop()
     # t1 = asyncio.create_task(game_server.start())
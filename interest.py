@@ -0,0 +1,40 @@
+import protocol
+from spatial_hash import SpatialHash
+
+
+# cuts a tick's snapshot down to what each client can see: the players and
+# bullets within radius pixels of its own ship. Entities entering or leaving a
+# client's view show up as created or removed in its next delta.
+class InterestFilter:
+    def __init__(self, snapshot, radius):
+        self.snapshot = snapshot
+        self.radius = protocol.quantize(radius)
+        self.grid = SpatialHash(self.radius, self.radius)
+
+        players, bullets = snapshot
+        for player_id, (x, y, life_point) in players.items():
+            self.grid.insert((True, player_id, x, y), x, y)
+        for bullet_id, (is_active, x, y) in bullets.items():
+            self.grid.insert((False, bullet_id, x, y), x, y)
+
+    def visible_to(self, player_id):
+        players, bullets = self.snapshot
+        visible_players = {}
+        visible_bullets = {}
+
+        viewer = players.get(player_id)
+        if viewer is None:
+            return visible_players, visible_bullets
+
+        viewer_x, viewer_y, _ = viewer
+        radius_squared = self.radius * self.radius
+        for is_player, entity_id, x, y in self.grid.query(viewer_x, viewer_y, self.radius, self.radius):
+            dx = x - viewer_x
+            dy = y - viewer_y
+            if dx * dx + dy * dy <= radius_squared:
+                if is_player:
+                    visible_players[entity_id] = players[entity_id]
+                else:
+                    visible_bullets[entity_id] = bullets[entity_id]
+
+        return visible_players, visible_bullets
@@ -0,0 +1,81 @@
+import collections
+
+# one snapshot as the network thread decoded it: {player id: (x, y)},
+# {bullet id: (x, y)} and {player id: life point}. Frames and their dicts
+# are never changed once published, so the render thread can read them
+# without locks.
+Frame = collections.namedtuple('Frame', 'time players bullets lives')
+
+
+def blend(older, newer, t):
+    # positions t of the way from older to newer, t > 1 runs past newer. What
+    # is in newer decides what exists, something new appears where it is.
+    positions = {}
+    for key, (x, y) in newer.items():
+        previous = older.get(key)
+        if previous is None:
+            positions[key] = (x, y)
+        else:
+            positions[key] = (previous[0] + (x - previous[0]) * t, previous[1] + (y - previous[1]) * t)
+    return positions
+
+
+# client side buffer of timestamped frames. Entities are drawn where they
+# were playout delay ago, interpolated between the two frames around that
+# time, so motion stays smooth between server ticks. When frames stop
+# coming the last movement is extrapolated for a little while, then they stop.
+#
+# The network thread is the only writer, every push publishes a new tuple of
+# frames with one reference assignment and the render thread reads whichever
+# tuple is current.
+class SnapshotBuffer:
+    def __init__(self, min_delay=0.1, max_extrapolation=0.25, size=32):
+        self.min_delay = min_delay
+        self.max_extrapolation = max_extrapolation
+        self.size = size
+        # oldest first
+        self.frames = ()
+        # smoothed time between frames, the delay stays two of them deep
+        # so a slower server tick needs no tuning
+        self.interval = None
+
+    def playout_delay(self):
+        if self.interval is None:
+            return self.min_delay
+        return max(self.min_delay, 2 * self.interval)
+
+    def push(self, frame):
+        frames = self.frames
+        if frames:
+            interval = frame.time - frames[-1].time
+            self.interval = interval if self.interval is None else self.interval + (interval - self.interval) * 0.1
+        self.frames = frames[1 - self.size:] + (frame,)
+
+    def sample(self, now):
+        # the Frame to draw at now, None before the first one arrived
+        frames = self.frames
+        if not frames:
+            return None
+        render_time = now - self.playout_delay()
+
+        if render_time <= frames[0].time:
+            return frames[0]
+
+        for index in range(len(frames) - 1, -1, -1):
+            if frames[index].time <= render_time:
+                break
+        if index + 1 < len(frames):
+            older, newer = frames[index], frames[index + 1]
+            time = render_time
+        else:
+            # ran out of frames
+            if len(frames) < 2:
+                return frames[-1]
+            older, newer = frames[-2], frames[-1]
+            time = min(render_time, newer.time + self.max_extrapolation)
+
+        span = newer.time - older.time
+        if span <= 0:
+            return newer
+        t = (time - older.time) / span
+        return Frame(time, blend(older.players, newer.players, t), blend(older.bullets, newer.bullets, t), newer.lives)
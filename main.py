@@ -1,17 +1,31 @@
 # Example file showing a basic pygame "game loop"
+#
+# Two players on one keyboard, arrows and space against WASD and Q. The ships
+# and bullets are a World stepped like the server steps it, this file only
+# reads the keys and draws.
+import time
+
 import pygame
 
+from world import World
+
 # pygame setup
 pygame.init()
 screen = pygame.display.set_mode((800, 800))
 clock = pygame.time.Clock()
 running = True
 
+# ticks of the World per second, the speeds are per second so this only
+# changes how smooth it looks
+TICK_RATE = 60
+# a held key applies its thrust again this often, like game-client.py sends it
+INPUT_REPEAT = 0.2
+
 def prepare_image(file_name, scale, angle):
     img = pygame.image.load(file_name)
-    img.convert()
     img = pygame.transform.rotozoom(img, angle, scale)
 
+    img = img.convert()
     img.set_colorkey("black")
 
     return img
@@ -60,24 +74,10 @@ class Console:
     def update(self):
         pass
 
-class Player1:
+# how a ship looks, where it is comes from the World
+class ShipSprite:
     def __init__(self, screen, image_files, scale, angle):
-        self.x = 0
-        self.y = 0
-
-        self.screen_width = screen.get_width()
-        self.screen_height = screen.get_height()
         self.screen = screen
-
-        self.width = 50
-        self.height = 50
-        self.color = "green"
-        self.speed_x = 0
-        self.speed_y = 0
-        self.acceleration = 0.1
-
-        self.lifepoint = 10
-
         self.image_index = 0
 
         self.images = []
@@ -87,197 +87,66 @@ class Player1:
         self.image = self.images[self.image_index]
         self.rect = self.image.get_rect()
 
-    def draw(self):
-        self.screen.blit(self.image, self.rect)
-
-        # pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-
-    def update(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
-
-        # prevent player from going off screen
-        if self.x < 0:
-            self.x = 0
-        elif self.x > screen.get_width() - self.width:
-            self.x = screen.get_width() - self.width
-        if self.y < 0:
-            self.y = 0
-        elif self.y > screen.get_height() - self.height:
-            self.y = screen.get_height() - self.height
-
-        # add friction
-        if self.speed_x > 0:
-            self.speed_x -= self.acceleration * 0.5
-        elif self.speed_x < 0:
-            self.speed_x += self.acceleration * 0.5
-        if self.speed_y > 0:
-            self.speed_y -= self.acceleration * 0.5
-        elif self.speed_y < 0:
-            self.speed_y += self.acceleration * 0.5
-
+    def draw(self, x, y):
         self.image_index += 1
         self.image_index %= len(self.images)
 
         self.image = self.images[self.image_index]
 
-        self.rect.x = self.x
-        self.rect.y = self.y
-
-
-    def move(self, direction):
-        if direction == "up":
-            self.speed_y += -self.acceleration
-        elif direction == "down":
-            self.speed_y += self.acceleration
-        elif direction == "left":
-            self.speed_x += -self.acceleration
-        elif direction == "right":
-            self.speed_x += self.acceleration
-
-class Player2:
-    def __init__(self, screen, image_files, scale, angle):
-        self.screen_width = screen.get_width()
-        self.screen_height = screen.get_height()
-        self.screen = screen
-
-        self.width = 50
-        self.height = 50
-
-        self.x = self.screen_width - (self.width)
-        self.y = self.screen_height - (self.height)
-
-        self.color = "green"
-        self.speed_x = 0
-        self.speed_y = 0
-        self.acceleration = 0.1
-
-        self.lifepoint = 10
-
-        self.image_index = 0
-
-        self.images = []
-        for file_name in image_files:
-            self.images.append(prepare_image(file_name, scale, angle))
-
-        self.image = self.images[self.image_index]
-        self.rect = self.image.get_rect()
-
-    def draw(self):
+        self.rect.x = x
+        self.rect.y = y
         self.screen.blit(self.image, self.rect)
 
-        # pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-
-    def update(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
-
-        # prevent player from going off screen
-        if self.x < 0:
-            self.x = 0
-        elif self.x > screen.get_width() - self.width:
-            self.x = screen.get_width() - self.width
-        if self.y < 0:
-            self.y = 0
-        elif self.y > screen.get_height() - self.height:
-            self.y = screen.get_height() - self.height
-
-        # add friction
-        if self.speed_x > 0:
-            self.speed_x -= self.acceleration * 0.5
-        elif self.speed_x < 0:
-            self.speed_x += self.acceleration * 0.5
-        if self.speed_y > 0:
-            self.speed_y -= self.acceleration * 0.5
-        elif self.speed_y < 0:
-            self.speed_y += self.acceleration * 0.5
-
-        self.image_index += 1
-        self.image_index %= len(self.images)
-
-        self.image = self.images[self.image_index]
-
-        self.rect.x = self.x
-        self.rect.y = self.y
-
-
-    def move(self, direction):
-        if direction == "up":
-            self.speed_y += -self.acceleration
-        elif direction == "down":
-            self.speed_y += self.acceleration
-        elif direction == "left":
-            self.speed_x += -self.acceleration
-        elif direction == "right":
-            self.speed_x += self.acceleration
-
-
-class Bullet:
-    def __init__(self, screen, image_files, scale, angle):
-        self.x = 0
-        self.y = 0
-
-        self.screen_width = screen.get_width()
-        self.screen_height = screen.get_height()
-        self.screen = screen
-
-        self.width = 10
-        self.height = 10
-        self.color = "red"
-        self.speed_x = 0
-        self.speed_y = 0
-
-        self.is_active = True
-
-        self.image_index = 0
-
-        self.images = []
-        for file_name in image_files:
-            self.images.append(prepare_image(file_name, scale, angle))
-
-        self.image = self.images[self.image_index]
-        self.rect = self.image.get_rect()
-
-    def draw(self):
-        if not self.is_active:
-            return
-
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-
-    def update(self):
-
-        self.x += self.speed_x
-        self.y += self.speed_y
-
-        if self.x < 0 or self.x > self.screen_width or self.y < 0 or self.y > self.screen_height:
-            self.is_active = False
-            return
-
-        self.image_index += 1
-        self.image_index %= len(self.images)
-
-        self.image = self.images[self.image_index]
-
-        self.rect.x = self.x
-        self.rect.y = self.y
-
-
-player1 = Player1(screen, ["images/ship1.png", "images/ship2.png", "images/ship3.png"], 0.25, 180)
-player2 = Player2(screen, ["images/e-ship1.png", "images/e-ship2.png", "images/e-ship3.png"], 0.25, 0)
+# one player's keys, turned into World inputs
+class Controls:
+    def __init__(self, up, down, left, right, fire):
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+        self.fire = fire
+        # a shot waits for the next tick
+        self.fired = 0
+        self.last_move = (0, 0)
+        self.last_applied = 0
+
+    def key_down(self, key):
+        if key == self.fire:
+            self.fired = 1
+
+    def input(self, pressed, now):
+        # (move_x, move_y, fire) for this tick, None when nothing new happened
+        move = (-1 if pressed[self.left] else 1 if pressed[self.right] else 0,
+                -1 if pressed[self.up] else 1 if pressed[self.down] else 0)
+        fire = self.fired
+        if not fire and move == self.last_move and (move == (0, 0) or now - self.last_applied < INPUT_REPEAT):
+            return None
+        self.fired = 0
+        self.last_move = move
+        self.last_applied = now
+        return move[0], move[1], fire
+
+
+world = World(TICK_RATE)
+# player 1 starts at the top and shoots down at player 2
+player1 = world.new_player(0, 0, 1)
+player1.bullet_direction = 1
+player2 = world.new_player(world.game_field_width - world.player_width, world.game_field_height - world.player_height, 2)
+world.add_player(player1)
+world.add_player(player2)
+
+sprites = {
+    player1: ShipSprite(screen, ["images/ship1.png", "images/ship2.png", "images/ship3.png"], 0.25, 180),
+    player2: ShipSprite(screen, ["images/e-ship1.png", "images/e-ship2.png", "images/e-ship3.png"], 0.25, 0),
+}
+controls = {
+    player1: Controls(pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE),
+    player2: Controls(pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d, pygame.K_q),
+}
 console = Console(screen)
 
-down_key = False
-up_key = False
-left_key = False
-right_key = False
-
-down_key2 = False
-up_key2 = False
-left_key2 = False
-right_key2 = False
-
-bullets = []
-bullets2 = []
+winner = None
+next_tick = time.monotonic()
 
 while running:
     # poll for events
@@ -286,114 +155,43 @@ while running:
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_UP:
-                up_key = True
-            elif event.key == pygame.K_DOWN:
-                down_key = True
-            elif event.key == pygame.K_LEFT:
-                left_key = True
-            elif event.key == pygame.K_RIGHT:
-                right_key = True
-            elif event.key == pygame.K_w:
-                up_key2 = True
-            elif event.key == pygame.K_s:
-                down_key2 = True
-            elif event.key == pygame.K_a:
-                left_key2 = True
-            elif event.key == pygame.K_d:
-                right_key2 = True
-            elif event.key == pygame.K_SPACE:
-                bullet = Bullet(screen, ['images/bullet.png'], 0.25, 0)
-                bullet.x = player1.x + player1.width / 2 - bullet.width / 2
-                bullet.y = player1.y + player1.height / 2 - bullet.height / 2
-                bullet.speed_y = +1
-                bullets.append(bullet)
-            elif event.key == pygame.K_q:
-                bullet = Bullet(screen, ['images/bullet.png'], 0.25, 0)
-                bullet.x = player2.x + player2.width / 2 - bullet.width / 2
-                bullet.y = player2.y + player2.height / 2 - bullet.height / 2
-                bullet.speed_y = -1
-                bullets2.append(bullet)
-
-            elif event.key == pygame.K_c:
+            if event.key == pygame.K_c:
                 if console.visible:
                     console.hide()
                 else:
                     console.show()
-
-        elif event.type == pygame.KEYUP:
-            if event.key == pygame.K_UP:
-                up_key = False
-            elif event.key == pygame.K_DOWN:
-                down_key = False
-            elif event.key == pygame.K_LEFT:
-                left_key = False
-            elif event.key == pygame.K_RIGHT:
-                right_key = False
-            elif event.key == pygame.K_w:
-                up_key2 = False
-            elif event.key == pygame.K_s:
-                down_key2 = False
-            elif event.key == pygame.K_a:
-                left_key2 = False
-            elif event.key == pygame.K_d:
-                right_key2 = False
-
-
-    if up_key:
-        player1.move("up")
-    if down_key:
-        player1.move("down")
-    if left_key:
-        player1.move("left")
-    if right_key:
-        player1.move("right")
-    if up_key2:
-        player2.move("up")
-    if down_key2:
-        player2.move("down")
-    if left_key2:
-        player2.move("left")
-    if right_key2:
-        player2.move("right")
+            for player_controls in controls.values():
+                player_controls.key_down(event.key)
+
+    # run the ticks that are due, until somebody lost
+    pressed = pygame.key.get_pressed()
+    now = time.monotonic()
+    while next_tick <= now and winner is None:
+        inputs = {}
+        for player, player_controls in controls.items():
+            player_input = player_controls.input(pressed, next_tick)
+            if player_input is not None:
+                inputs[player] = player_input
+        world.step(inputs)
+        next_tick += world.dt
+
+        for player in world.players:
+            if player.life_point <= 0:
+                winner = player2 if player is player1 else player1
 
     # fill the screen with a color to wipe away anything from last frame
     screen.fill("black")
 
-    player1.update()
-    player1.draw()
-
-    player2.update()
-    player2.draw()
-
-    # remove inactive bullets
-    for bullet in bullets:
-        # when the ship got hit
-        if (bullet.x >= (player2.x) and bullet.x <= (player2.x + (player2.width))) and (bullet.y >= (player2.y) and bullet.y <= (player2.y + (player2.height))):
-            player2.lifepoint -= 1
-            bullets.remove(bullet)
-        
-        bullet.update()
-        bullet.draw()
-
-    for bullet in bullets2:
-        # when the ship got hit
-        if (bullet.x >= (player1.x) and bullet.x <= (player1.x + (player1.width))) and (bullet.y >= (player1.y) and bullet.y <= (player1.y + (player1.height))):
-            player1.lifepoint -= 1
-            bullets2.remove(bullet)
-        
-        bullet.update()
-        bullet.draw()
-
-    bullets = [bullet for bullet in bullets if bullet.is_active]
-    bullets2 = [bullet for bullet in bullets2 if bullet.is_active]
-
+    for player, sprite in sprites.items():
+        sprite.draw(player.x, player.y)
 
-    # when the ship got hit
+    for bullet in world.bullets:
+        pygame.draw.rect(screen, "red", (bullet.x, bullet.y, bullet.width, bullet.height))
 
-    console.log(f"Player 1: {int(player1.x)}, y: {int(player1.y)}; Speed x: {int(player1.speed_x)}, Speed y: {int(player1.speed_y)}")
-    console.log(f"Player 2: {int(player2.x)}, y: {int(player2.y)}; Speed x: {int(player2.speed_x)}, Speed y: {int(player2.speed_y)}")
-    console.log(f"Player 1: {int(player1.lifepoint)}      Player 2: {int(player2.lifepoint)}")
+    if winner is None:
+        console.log(f"Player 1: {player1.life_point}      Player 2: {player2.life_point}")
+    else:
+        console.log(f"Player {winner.id} wins")
     console.draw()
 
     # flip() the display to put your work on screen
@@ -401,4 +199,4 @@ while running:
 
     clock.tick(60)  # limits FPS to 60
 
-pygame.quit()
\ No newline at end of file
+pygame.quit()
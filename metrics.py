@@ -0,0 +1,119 @@
+import asyncio
+import bisect
+import logging
+
+# upper bounds in seconds, a 50 ms tick should land well inside them
+TICK_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+PHASES = ('simulate', 'encode', 'send')
+
+
+class Histogram:
+    def __init__(self, buckets=TICK_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_bucket{format_labels(labels, le="+Inf")} {self.count}'
+        yield f'{name}_sum{format_labels(labels)} {self.sum}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def family(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def render(rooms):
+    # Prometheus text exposition of every room served by this process
+    lines = []
+
+    family(lines, 'game_tick_phase_seconds', 'histogram', 'Time spent per tick in each phase.')
+    for room in rooms:
+        for phase in PHASES:
+            lines.extend(room.phase_times[phase].samples('game_tick_phase_seconds', {'room': room.name, 'phase': phase}))
+
+    family(lines, 'game_ticks_total', 'counter', 'Ticks run.')
+    lines.extend(f'game_ticks_total{format_labels({"room": room.name})} {room.scheduler.ticks}' for room in rooms)
+    family(lines, 'game_tick_overruns_total', 'counter', 'Ticks whose work took longer than the tick period.')
+    lines.extend(f'game_tick_overruns_total{format_labels({"room": room.name})} {room.scheduler.overruns}' for room in rooms)
+    family(lines, 'game_ticks_skipped_total', 'counter', 'Simulation steps dropped to get back on schedule.')
+    lines.extend(f'game_ticks_skipped_total{format_labels({"room": room.name})} {room.scheduler.skipped}' for room in rooms)
+
+    family(lines, 'game_inputs_received_total', 'counter', 'Input messages received from clients.')
+    lines.extend(f'game_inputs_received_total{format_labels({"room": room.name})} {room.inputs_received}' for room in rooms)
+    family(lines, 'game_inputs_merged_total', 'counter', 'Inputs coalesced into another one of the same tick.')
+    lines.extend(f'game_inputs_merged_total{format_labels({"room": room.name})} {room.inputs_merged}' for room in rooms)
+    family(lines, 'game_inputs_dropped_total', 'counter', 'Inputs dropped because the buffer was full.')
+    lines.extend(f'game_inputs_dropped_total{format_labels({"room": room.name})} {room.inputs_dropped}' for room in rooms)
+    family(lines, 'game_inputs_stale_total', 'counter', 'Inputs discarded for a sequence number at or below one already received.')
+    lines.extend(f'game_inputs_stale_total{format_labels({"room": room.name})} {room.inputs_stale}' for room in rooms)
+
+    family(lines, 'game_client_bytes_sent_total', 'counter', 'Bytes written to each connected client.')
+    for room in rooms:
+        for player in room.players:
+            if player.outbound is not None:
+                lines.append(f'game_client_bytes_sent_total{format_labels({"room": room.name, "player": player.id})} {player.outbound.bytes_sent}')
+    family(lines, 'game_bytes_sent_total', 'counter', 'Bytes written to all clients, including departed ones.')
+    lines.extend(f'game_bytes_sent_total{format_labels({"room": room.name})} {room.bytes_sent()}' for room in rooms)
+    compression = [(room, room.compression()) for room in rooms]
+    family(lines, 'game_compression_input_bytes_total', 'counter', 'Bytes fed to the compressors of clients that asked for compression.')
+    lines.extend(f'game_compression_input_bytes_total{format_labels({"room": room.name})} {stats[0]}' for room, stats in compression)
+    family(lines, 'game_compression_output_bytes_total', 'counter', 'Compressed bytes those compressors produced.')
+    lines.extend(f'game_compression_output_bytes_total{format_labels({"room": room.name})} {stats[1]}' for room, stats in compression)
+    family(lines, 'game_compression_seconds_total', 'counter', 'Time spent compressing.')
+    lines.extend(f'game_compression_seconds_total{format_labels({"room": room.name})} {stats[2]}' for room, stats in compression)
+
+    family(lines, 'game_players', 'gauge', 'Players in the game.')
+    lines.extend(f'game_players{format_labels({"room": room.name})} {len(room.players)}' for room in rooms)
+    family(lines, 'game_bullets', 'gauge', 'Bullets in flight.')
+    lines.extend(f'game_bullets{format_labels({"room": room.name})} {room.bullet_count()}' for room in rooms)
+    family(lines, 'game_connections', 'gauge', 'Open client connections, joined or not.')
+    lines.extend(f'game_connections{format_labels({"room": room.name})} {room.connections}' for room in rooms)
+
+    return '\n'.join(lines) + '\n'
+
+
+async def serve(rooms, host='127.0.0.1', port=9100):
+    # bare HTTP endpoint, GET /metrics returns render(rooms)
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b'GET' and parts[1] == b'/metrics':
+                body = render(rooms).encode()
+                status = b'200 OK'
+            else:
+                body = b'not found\n'
+                status = b'404 Not Found'
+            writer.write(b'HTTP/1.0 ' + status + b'\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logging.info(f'Metrics on http://{host}:{port}/metrics')
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,113 @@
+import asyncio
+import collections
+import time
+import zlib
+
+import protocol
+
+
+# per connection send buffer drained by its own writer task, so a client with
+# a full TCP buffer only ever holds up itself. Snapshots are latest state wins:
+# a snapshot still waiting when the next one arrives is replaced by it.
+# A snapshot comes as the parts it is made of, the ones every client gets are
+# the same bytes objects for all of them and go to the transport unchanged.
+#
+# Once compress() is called everything sent afterwards goes out through one
+# zlib stream that lives as long as the connection, so it learns what
+# snapshots look like. Whatever one wakeup of the writer task finds queued,
+# usually one tick's worth, is compressed together and sync flushed.
+class OutboundQueue:
+    def __init__(self, writer, max_messages=16):
+        self.writer = writer
+        self.max_messages = max_messages
+        self.messages = collections.deque()
+        self.snapshot = None
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        # snapshots replaced in a row because the previous one never left
+        self.stalled = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.task = None
+        self.compressor = None
+        # messages at the head of the queue that were sent before compress()
+        self.plain = 0
+        # bytes into and out of the compressor and the seconds it took
+        self.compress_input = 0
+        self.compress_output = 0
+        self.compress_seconds = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    def compress(self, level):
+        self.compressor = zlib.compressobj(level)
+        self.plain = len(self.messages)
+
+    def send(self, data):
+        # messages that must all arrive, a client that lets them pile up is closed
+        if self.closed:
+            return
+        if len(self.messages) >= self.max_messages:
+            self.close()
+            return
+        self.messages.append(data)
+        self.wakeup.set()
+
+    def send_snapshot(self, parts):
+        # parts are bytes written back to back
+        if self.closed:
+            return
+        if self.snapshot is not None:
+            self.stalled += 1
+            self.dropped += 1
+        self.snapshot = parts
+        self.wakeup.set()
+
+    async def run(self):
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                batch = []
+                while self.messages:
+                    message = self.messages.popleft()
+                    if self.plain:
+                        self.plain -= 1
+                        self.write(message)
+                    else:
+                        batch.append(message)
+                if self.snapshot is not None:
+                    batch.extend(self.snapshot)
+                    self.snapshot = None
+                    self.stalled = 0
+                if self.compressor is None:
+                    self.writelines(batch)
+                elif batch:
+                    data = b''.join(batch)
+                    start = time.perf_counter()
+                    compressed = protocol.compress(self.compressor, data)
+                    self.compress_seconds += time.perf_counter() - start
+                    self.compress_input += len(data)
+                    self.compress_output += len(compressed)
+                    self.write(compressed)
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+
+    def write(self, data):
+        self.writer.write(data)
+        self.bytes_sent += len(data)
+
+    def writelines(self, batch):
+        self.writer.writelines(batch)
+        self.bytes_sent += sum(map(len, batch))
+
+    def close(self):
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+        self.writer.close()
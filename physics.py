@@ -0,0 +1,44 @@
+# ship movement rules, shared by the server simulation and the client's
+# prediction of its own ship so both move it the same way
+
+# speeds are in pixels per second, every input adds THRUST to them and
+# friction takes half of ACCELERATION off them every second
+THRUST = 20
+ACCELERATION = 40
+FIELD_WIDTH = 800
+FIELD_HEIGHT = 800
+PLAYER_WIDTH = 60
+PLAYER_HEIGHT = 75
+
+
+def move(x, y, speed_x, speed_y, dt, friction, max_x, max_y):
+    # one step of a ship that did not bump into another one, returns the new
+    # (x, y, speed_x, speed_y)
+    x += speed_x * dt
+    y += speed_y * dt
+
+    # prevent player from going off screen
+    if x < 0:
+        x = 0
+        speed_x = 0
+    elif x > max_x:
+        x = max_x
+        speed_x = 0
+    if y < 0:
+        y = 0
+        speed_y = 0
+    elif y > max_y:
+        y = max_y
+        speed_y = 0
+
+    # add friction
+    if speed_x > 0:
+        speed_x -= friction
+    elif speed_x < 0:
+        speed_x += friction
+    if speed_y > 0:
+        speed_y -= friction
+    elif speed_y < 0:
+        speed_y += friction
+
+    return x, y, speed_x, speed_y
@@ -0,0 +1,88 @@
+import collections
+import time
+
+import physics
+
+
+# client side prediction of the player's own ship. Inputs move the ship
+# locally at the server's tick rate as soon as they are sent, by the same
+# rules as the server. Every input ack from the server resets the ship to
+# where the server had it and replays the local ticks the server has not seen
+# yet on top. Bumping into other ships is left to the server, the next ack
+# corrects it.
+class Predictor:
+    def __init__(self, tick_rate, history_size=128):
+        self.dt = 1 / tick_rate
+        self.friction = physics.ACCELERATION * 0.5 * self.dt
+        self.max_x = physics.FIELD_WIDTH - physics.PLAYER_WIDTH
+        self.max_y = physics.FIELD_HEIGHT - physics.PLAYER_HEIGHT
+
+        # (x, y, speed_x, speed_y), None until the server first tells where the ship is
+        self.state = None
+        self.tick = 0
+        # inputs sent since the last local tick, as (sequence, move_x, move_y)
+        self.queued = []
+        # local tick every unacknowledged input was applied at, by sequence
+        self.applied = {}
+        # thrust (move_x, move_y) or None of the latest local ticks, oldest first
+        self.history = collections.deque(maxlen=history_size)
+        # ((x, y) before the last tick, (x, y) after it, when it ran), read by
+        # the render loop in one go
+        self.frame = None
+
+    def queue(self, sequence, move_x, move_y):
+        self.queued.append((sequence, move_x, move_y))
+
+    def advance(self, state, thrust):
+        x, y, speed_x, speed_y = state
+        if thrust is not None:
+            speed_x += thrust[0] * physics.THRUST
+            speed_y += thrust[1] * physics.THRUST
+        return physics.move(x, y, speed_x, speed_y, self.dt, self.friction, self.max_x, self.max_y)
+
+    def step(self):
+        # one local tick, like the server the newest queued input wins
+        self.tick += 1
+        thrust = None
+        if self.queued:
+            _, move_x, move_y = self.queued[-1]
+            for sequence, _, _ in self.queued:
+                self.applied[sequence] = self.tick
+            self.queued = []
+            thrust = (move_x, move_y)
+        self.history.append(thrust)
+        if self.state is not None:
+            previous = self.state
+            self.state = self.advance(self.state, thrust)
+            self.frame = (previous[:2], self.state[:2], time.monotonic())
+
+    def reconcile(self, sequence, ticks_since, x, y, speed_x, speed_y):
+        state = (x, y, speed_x, speed_y)
+        applied_at = self.applied.get(sequence)
+        for acked in [acked for acked in self.applied if acked <= sequence]:
+            del self.applied[acked]
+
+        if applied_at is not None:
+            # the server state is the one after local tick applied_at + ticks_since
+            first = self.tick - len(self.history) + 1
+            for tick in range(max(applied_at + ticks_since + 1, first), self.tick + 1):
+                state = self.advance(state, self.history[tick - first])
+        elif self.applied:
+            # the server has not applied anything this client still knows about
+            # yet, keep predicting from where we are
+            return
+
+        self.state = state
+        if self.frame is None:
+            self.frame = (state[:2], state[:2], time.monotonic())
+        else:
+            self.frame = (self.frame[0], state[:2], self.frame[2])
+
+    def position(self, now):
+        # where to draw the ship, between the last two local ticks
+        frame = self.frame
+        if frame is None:
+            return None
+        (previous_x, previous_y), (x, y), step_time = frame
+        t = min(1.0, (now - step_time) / self.dt)
+        return previous_x + (x - previous_x) * t, previous_y + (y - previous_y) * t
@@ -0,0 +1,431 @@
+import asyncio
+import struct
+import zlib
+
+# wire format shared by game-server.py and game-client.py
+#
+# The server greets every connection with the text line
+# "id:<player id>:<version>:<tick rate>". Old clients only read the id and keep
+# talking the text protocol. A client that
+# answers with "proto:<version>" switches both directions to length-prefixed
+# binary frames:
+#
+#   frame   = length (uint32) + payload
+#   payload = version (uint8) + message type (uint8) + body
+#
+# Coordinates are quantized to 1/COORD_SCALE of a pixel.
+#
+# Snapshots are delta-compressed: each one names the tick it was taken at and
+# the baseline tick it is relative to, and only carries entities that were
+# created or changed since the baseline plus the ids of the ones that went
+# away. Baseline 0 is a keyframe holding everything. Clients acknowledge every
+# snapshot they applied, the server diffs against the newest acknowledged one
+# and falls back to a keyframe when it has no usable baseline.
+#
+# Binary inputs carry a sequence number. Every snapshot is followed by an input
+# ack for the receiving client: the newest input the server applied, how many
+# ticks ago, and where that left the client's ship, so the client can replay
+# the inputs it sent since on top of it.
+#
+# A server with UDP enabled offers binary clients a port and a token over TCP.
+# A client that wants it sends the token from its UDP socket until snapshots
+# start to arrive there: from then on every snapshot with its input ack goes
+# out as one datagram, frames as above. The snapshot tick numbers them, a
+# datagram older than the newest snapshot applied is dropped. Everything else
+# stays on TCP.
+#
+# A server that compresses adds ":zlib" to the handshake. A client that wants
+# it asks with "proto:<version>:zlib", version 0 staying on the text protocol.
+# Everything the server sends after that is one zlib stream, sync flushed
+# after every batch of messages, so it decompresses as it arrives. Datagrams
+# are never compressed.
+
+TEXT = 0
+PROTOCOL_VERSION = 4
+COORD_SCALE = 16
+# snapshots a server keeps per client as possible baselines
+HISTORY_SIZE = 32
+
+MSG_SNAPSHOT = 1
+MSG_INPUT = 2
+MSG_ACK = 3
+MSG_INPUT_ACK = 4
+MSG_UDP_OFFER = 5
+MSG_UDP_BIND = 6
+
+COMPRESSION = "zlib"
+# longest frame length read from the wire unless the reader asks for less,
+# far above a keyframe of thousands of entities
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+FRAME_HEADER = struct.Struct('!I')
+MESSAGE_HEADER = struct.Struct('!BB')
+# both headers, what a frame starts with
+FRAME_PREFIX = struct.Struct('!IBB')
+# tick, baseline tick, changed players, changed bullets, removed players, removed bullets
+SNAPSHOT_HEADER = struct.Struct('!IIHHHH')
+# id, x, y, life_point
+PLAYER_RECORD = struct.Struct('!Iiih')
+# owner id, sequence, is_active, x, y
+BULLET_RECORD = struct.Struct('!IIBii')
+PLAYER_ID = struct.Struct('!I')
+BULLET_ID = struct.Struct('!II')
+# move_x, move_y, fire, input sequence
+INPUT_RECORD = struct.Struct('!bbBI')
+ACK_RECORD = struct.Struct('!I')
+# input sequence, ticks since it was applied, x, y, speed_x, speed_y
+INPUT_ACK_RECORD = struct.Struct('!IHffff')
+# udp port, token
+UDP_OFFER_RECORD = struct.Struct('!HQ')
+# player id, token
+UDP_BIND_RECORD = struct.Struct('!IQ')
+
+
+def quantize(value):
+    return round(value * COORD_SCALE)
+
+
+def dequantize(value):
+    return value / COORD_SCALE
+
+
+def encode_handshake(player_id, tick_rate, compression=False):
+    offer = f":{COMPRESSION}" if compression else ""
+    return f"id:{player_id}:{PROTOCOL_VERSION}:{tick_rate}{offer}\n".encode()
+
+
+def decode_handshake(line):
+    # returns (player id, highest binary version the server speaks, tick rate
+    # or None when the server does not tell, whether it offers compression)
+    parts = line.decode().strip().split(":")
+    version = int(parts[2]) if len(parts) > 2 else TEXT
+    tick_rate = float(parts[3]) if len(parts) > 3 else None
+    compression = len(parts) > 4 and parts[4] == COMPRESSION
+    return int(parts[1]), version, tick_rate, compression
+
+
+def encode_hello(version=PROTOCOL_VERSION, compression=False):
+    option = f":{COMPRESSION}" if compression else ""
+    return f"proto:{version}{option}\n".encode()
+
+
+def decode_hello(line):
+    # (version, compression) asked for by the client, None when the line is
+    # already a plain text input. A version the server does not speak is TEXT.
+    if not line.startswith(b"proto:"):
+        return None
+    version, *options = line[len(b"proto:"):].strip().split(b":")
+    version = int(version)
+    if version != PROTOCOL_VERSION:
+        version = TEXT
+    return version, COMPRESSION.encode() in options
+
+
+def compress(compressor, data):
+    # data through the connection's zlib stream, flushed so the client can
+    # decompress all of it right away
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class Decompressor:
+    # client side, reads the server's zlib stream from reader and offers it
+    # decompressed on self.reader, a StreamReader like any other
+    def __init__(self, reader):
+        self.reader = asyncio.StreamReader()
+        self.decompressor = zlib.decompressobj()
+        # compressed bytes received
+        self.bytes_received = 0
+        self.task = asyncio.create_task(self.run(reader))
+
+    async def run(self, source):
+        try:
+            while True:
+                data = await source.read(65536)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                self.reader.feed_data(self.decompressor.decompress(data))
+        finally:
+            self.reader.feed_eof()
+
+
+def frame(message_type, body):
+    payload = MESSAGE_HEADER.pack(PROTOCOL_VERSION, message_type) + body
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def take_frames(data, max_size=MAX_FRAME_SIZE):
+    # the complete frames at the start of data as (message type, body) and the
+    # bytes they take up, a frame still arriving is left for later
+    frames = []
+    offset = 0
+    end = len(data)
+    unpack_prefix = FRAME_PREFIX.unpack_from
+    while offset + FRAME_PREFIX.size <= end:
+        length, version, message_type = unpack_prefix(data, offset)
+        if length < MESSAGE_HEADER.size:
+            raise ValueError("frame too short")
+        if length > max_size:
+            raise ValueError(f"frame of {length} bytes is too long")
+        next_offset = offset + FRAME_HEADER.size + length
+        if next_offset > end:
+            break
+        if version != PROTOCOL_VERSION:
+            raise ValueError(f"unsupported protocol version {version}")
+        frames.append((message_type, data[offset + FRAME_PREFIX.size:next_offset]))
+        offset = next_offset
+    return frames, offset
+
+
+def split_frames(data):
+    # (message type, body) of every frame in data, e.g. a datagram
+    frames, used = take_frames(data)
+    if used != len(data):
+        raise ValueError("truncated frame")
+    return frames
+
+
+async def read_frame(reader, max_size=MAX_FRAME_SIZE):
+    # returns (message type, body), raises asyncio.IncompleteReadError on EOF
+    # and ValueError on a frame that is not one
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (length,) = FRAME_HEADER.unpack(header)
+    if length < MESSAGE_HEADER.size:
+        raise ValueError("frame too short")
+    if length > max_size:
+        raise ValueError(f"frame of {length} bytes is too long")
+    payload = await reader.readexactly(length)
+    version, message_type = MESSAGE_HEADER.unpack_from(payload)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"unsupported protocol version {version}")
+    return message_type, payload[MESSAGE_HEADER.size:]
+
+
+# state is (players, bullets) as produced by GameServer.update_state:
+#   players: (id, x, y, life_point)
+#   bullets: (owner id, sequence, is_active, x, y)
+
+def encode_text_state(state):
+    # built as lists joined once, the state string is never copied per entity
+    players, bullets = state
+    player_fields = ''.join([f'{player_id},{x},{y},{life_point},' for player_id, x, y, life_point in players])
+    bullet_fields = ','.join([f'{owner}_{seq}, {int(is_active)}, {x}, {y}' for owner, seq, is_active, x, y in bullets])
+    return f"{player_fields}:{bullet_fields}\n".encode()
+
+
+def decode_text_state(message):
+    pre_data_parts = message.decode().split(":")
+    data_parts = pre_data_parts[0].split(",")
+    data_parts = data_parts[:-1]
+    bullet_parts = pre_data_parts[1].split(",")
+    bullet_parts[-1] = bullet_parts[-1][:-1]
+
+    players = []
+    for i in range(0, len(data_parts), 4):
+        players.append((int(data_parts[i]), float(data_parts[i + 1]), float(data_parts[i + 2]), int(data_parts[i + 3])))
+
+    bullets = []
+    if len(bullet_parts) != 1:
+        for i in range(0, len(bullet_parts), 4):
+            bullets.append((bullet_parts[i], int(bullet_parts[i + 1]), float(bullet_parts[i + 2]), float(bullet_parts[i + 3])))
+
+    return players, bullets
+
+
+def make_snapshot(state):
+    # quantized, id-keyed view of a state, this is what gets diffed
+    players, bullets = state
+    return (
+        {player_id: (quantize(x), quantize(y), life_point) for player_id, x, y, life_point in players},
+        {(owner, seq): (int(is_active), quantize(x), quantize(y)) for owner, seq, is_active, x, y in bullets},
+    )
+
+
+def encode_snapshot(tick, snapshot, baseline_tick=0, baseline=None):
+    players, bullets = snapshot
+    if baseline is None:
+        baseline_tick = 0
+        baseline = ({}, {})
+    baseline_players, baseline_bullets = baseline
+
+    changed_players = [(player_id, record) for player_id, record in players.items() if baseline_players.get(player_id) != record]
+    changed_bullets = [(bullet_id, record) for bullet_id, record in bullets.items() if baseline_bullets.get(bullet_id) != record]
+    removed_players = [player_id for player_id in baseline_players if player_id not in players]
+    removed_bullets = [bullet_id for bullet_id in baseline_bullets if bullet_id not in bullets]
+
+    body = bytearray(SNAPSHOT_HEADER.size
+                     + PLAYER_RECORD.size * len(changed_players) + BULLET_RECORD.size * len(changed_bullets)
+                     + PLAYER_ID.size * len(removed_players) + BULLET_ID.size * len(removed_bullets))
+    SNAPSHOT_HEADER.pack_into(body, 0, tick, baseline_tick, len(changed_players), len(changed_bullets), len(removed_players), len(removed_bullets))
+    offset = SNAPSHOT_HEADER.size
+    for player_id, record in changed_players:
+        PLAYER_RECORD.pack_into(body, offset, player_id, *record)
+        offset += PLAYER_RECORD.size
+    for bullet_id, record in changed_bullets:
+        BULLET_RECORD.pack_into(body, offset, *bullet_id, *record)
+        offset += BULLET_RECORD.size
+    for player_id in removed_players:
+        PLAYER_ID.pack_into(body, offset, player_id)
+        offset += PLAYER_ID.size
+    for bullet_id in removed_bullets:
+        BULLET_ID.pack_into(body, offset, *bullet_id)
+        offset += BULLET_ID.size
+    return frame(MSG_SNAPSHOT, bytes(body))
+
+
+def snapshot_tick(body):
+    return SNAPSHOT_HEADER.unpack_from(body)[0]
+
+
+def decode_snapshot(body):
+    # returns (tick, baseline tick, changed players, changed bullets, removed players, removed bullets)
+    # with records still quantized and keyed like make_snapshot
+    tick, baseline_tick, player_count, bullet_count, removed_player_count, removed_bullet_count = SNAPSHOT_HEADER.unpack_from(body)
+    offset = SNAPSHOT_HEADER.size
+
+    changed_players = {}
+    for player_id, x, y, life_point in PLAYER_RECORD.iter_unpack(body[offset:offset + PLAYER_RECORD.size * player_count]):
+        changed_players[player_id] = (x, y, life_point)
+    offset += PLAYER_RECORD.size * player_count
+
+    changed_bullets = {}
+    for owner, seq, is_active, x, y in BULLET_RECORD.iter_unpack(body[offset:offset + BULLET_RECORD.size * bullet_count]):
+        changed_bullets[(owner, seq)] = (is_active, x, y)
+    offset += BULLET_RECORD.size * bullet_count
+
+    removed_players = [player_id for (player_id,) in PLAYER_ID.iter_unpack(body[offset:offset + PLAYER_ID.size * removed_player_count])]
+    offset += PLAYER_ID.size * removed_player_count
+
+    removed_bullets = list(BULLET_ID.iter_unpack(body[offset:offset + BULLET_ID.size * removed_bullet_count]))
+
+    return tick, baseline_tick, changed_players, changed_bullets, removed_players, removed_bullets
+
+
+class SnapshotSender:
+    # server side of the delta compression for one client
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.history_size = history_size
+        self.history = {}
+        self.acked_tick = 0
+
+    def baseline_tick(self):
+        # tick the next snapshot will be diffed against, 0 for a keyframe
+        return self.acked_tick if self.acked_tick in self.history else 0
+
+    def record(self, tick, snapshot):
+        self.history[tick] = snapshot
+        self.history.pop(tick - self.history_size, None)
+
+    def encode(self, tick, snapshot):
+        baseline_tick = self.baseline_tick()
+        message = encode_snapshot(tick, snapshot, baseline_tick, self.history.get(baseline_tick))
+        self.record(tick, snapshot)
+        return message
+
+    def ack(self, tick):
+        if tick > self.acked_tick and tick in self.history:
+            self.acked_tick = tick
+
+
+class SnapshotReceiver:
+    # client side of the delta compression, rebuilds full snapshots from deltas
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.history_size = history_size
+        self.history = {}
+        self.latest = ({}, {})
+        # tick of the newest snapshot applied
+        self.tick = 0
+
+    def receive(self, body):
+        # returns (tick, changed players, changed bullets, removed players, removed bullets)
+        # dequantized like decode_text_state, or None when the baseline is
+        # unknown or a newer snapshot was applied already
+        tick, baseline_tick, changed_players, changed_bullets, removed_players, removed_bullets = decode_snapshot(body)
+        if tick <= self.tick:
+            return None
+        if baseline_tick == 0:
+            # a keyframe drops everything it does not mention
+            baseline = ({}, {})
+            latest_players, latest_bullets = self.latest
+            removed_players = [player_id for player_id in latest_players if player_id not in changed_players]
+            removed_bullets = [bullet_id for bullet_id in latest_bullets if bullet_id not in changed_bullets]
+        else:
+            baseline = self.history.get(baseline_tick)
+            if baseline is None:
+                return None
+
+        players = dict(baseline[0])
+        players.update(changed_players)
+        for player_id in removed_players:
+            players.pop(player_id, None)
+        bullets = dict(baseline[1])
+        bullets.update(changed_bullets)
+        for bullet_id in removed_bullets:
+            bullets.pop(bullet_id, None)
+
+        self.latest = (players, bullets)
+        self.tick = tick
+        self.history[tick] = self.latest
+        for old_tick in [old_tick for old_tick in self.history if old_tick <= tick - self.history_size]:
+            del self.history[old_tick]
+
+        return (
+            tick,
+            [(player_id, dequantize(x), dequantize(y), life_point) for player_id, (x, y, life_point) in changed_players.items()],
+            [(bullet_id, is_active, dequantize(x), dequantize(y)) for bullet_id, (is_active, x, y) in changed_bullets.items()],
+            removed_players,
+            removed_bullets,
+        )
+
+
+def decode_text_input(line):
+    # "x,y,fire" with an optional input sequence, 0 when there is none
+    x_action, y_action, fire_action, *sequence = line.split(b',')
+    return float(x_action), float(y_action), int(fire_action), int(sequence[0]) if sequence else 0
+
+
+def encode_input(move_x, move_y, fire, sequence):
+    return frame(MSG_INPUT, INPUT_RECORD.pack(move_x, move_y, fire, sequence))
+
+
+def unpack(record, body):
+    # a body of the wrong size is garbage like a bad frame, a ValueError
+    if len(body) != record.size:
+        raise ValueError(f"body of {len(body)} bytes, expected {record.size}")
+    return record.unpack(body)
+
+
+def decode_input(body):
+    return unpack(INPUT_RECORD, body)
+
+
+def encode_ack(tick):
+    return frame(MSG_ACK, ACK_RECORD.pack(tick))
+
+
+def decode_ack(body):
+    return unpack(ACK_RECORD, body)[0]
+
+
+def encode_input_ack(sequence, ticks_since, x, y, speed_x, speed_y):
+    return frame(MSG_INPUT_ACK, INPUT_ACK_RECORD.pack(sequence, min(ticks_since, 0xFFFF), x, y, speed_x, speed_y))
+
+
+def decode_input_ack(body):
+    return unpack(INPUT_ACK_RECORD, body)
+
+
+def encode_udp_offer(port, token):
+    return frame(MSG_UDP_OFFER, UDP_OFFER_RECORD.pack(port, token))
+
+
+def decode_udp_offer(body):
+    return unpack(UDP_OFFER_RECORD, body)
+
+
+def encode_udp_bind(player_id, token):
+    return frame(MSG_UDP_BIND, UDP_BIND_RECORD.pack(player_id, token))
+
+
+def decode_udp_bind(body):
+    return unpack(UDP_BIND_RECORD, body)
@@ -0,0 +1,102 @@
+import struct
+
+# append-only log of everything that feeds a room's simulation: the header,
+# then join / leave / tick records in the order the server saw them. Replaying
+# it without sockets gives the same state tick for tick.
+MAGIC = b'GREC'
+VERSION = 3
+
+REC_JOIN = 1
+REC_LEAVE = 2
+REC_TICK = 3
+
+# magic, version, tick rate, field width and height, length of the server class name
+HEADER = struct.Struct('!4sBdHHB')
+RECORD_TYPE = struct.Struct('!B')
+JOIN_RECORD = struct.Struct('!Idd')
+LEAVE_RECORD = struct.Struct('!I')
+# tick, simulation steps, input count, hash of the state the tick produced
+TICK_RECORD = struct.Struct('!IBHQ')
+# player id, move x, move y, fire, input sequence as the server received them
+INPUT_RECORD = struct.Struct('!IddbI')
+# ticks between flushes, a killed worker loses at most this many
+FLUSH_EVERY = 100
+
+
+def state_hash(state):
+    # the records only hold ints, floats and bools, so the hash is the same in
+    # every process
+    players, bullets = state
+    return hash((tuple(players), tuple(bullets))) & 0xFFFFFFFFFFFFFFFF
+
+
+class Recorder:
+    def __init__(self, path, tick_rate, field_width, field_height, server_class):
+        self.file = open(path, 'wb')
+        name = server_class.encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, tick_rate, field_width, field_height, len(name)) + name)
+
+    def join(self, player_id, x, y):
+        self.file.write(RECORD_TYPE.pack(REC_JOIN) + JOIN_RECORD.pack(player_id, x, y))
+
+    def leave(self, player_id):
+        self.file.write(RECORD_TYPE.pack(REC_LEAVE) + LEAVE_RECORD.pack(player_id))
+
+    def tick(self, tick, steps, inputs, state):
+        parts = [RECORD_TYPE.pack(REC_TICK), TICK_RECORD.pack(tick, steps, len(inputs), state_hash(state))]
+        for player_id, (move_x, move_y, fire, sequence) in inputs:
+            parts.append(INPUT_RECORD.pack(player_id, move_x, move_y, fire, sequence))
+        self.file.write(b''.join(parts))
+        if tick % FLUSH_EVERY == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path):
+    # returns the header as a dict and a generator of the records, a record
+    # cut short by the server being killed ends the log
+    file = open(path, 'rb')
+    magic, version, tick_rate, field_width, field_height, name_length = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        file.close()
+        raise ValueError(f'{path} is not a version {VERSION} recording')
+    header = {
+        'tick_rate': tick_rate,
+        'field_width': field_width,
+        'field_height': field_height,
+        'server_class': file.read(name_length).decode(),
+    }
+
+    def read(record):
+        data = file.read(record.size)
+        if len(data) < record.size:
+            raise EOFError
+        return record.unpack(data)
+
+    def records():
+        with file:
+            try:
+                while True:
+                    data = file.read(RECORD_TYPE.size)
+                    if not data:
+                        return
+                    record_type, = RECORD_TYPE.unpack(data)
+                    if record_type == REC_JOIN:
+                        yield (REC_JOIN, *read(JOIN_RECORD))
+                    elif record_type == REC_LEAVE:
+                        yield (REC_LEAVE, *read(LEAVE_RECORD))
+                    elif record_type == REC_TICK:
+                        tick, steps, input_count, digest = read(TICK_RECORD)
+                        inputs = []
+                        for _ in range(input_count):
+                            player_id, *message = read(INPUT_RECORD)
+                            inputs.append((player_id, tuple(message)))
+                        yield REC_TICK, tick, steps, inputs, digest
+                    else:
+                        raise ValueError(f'unknown record type {record_type} in {path}')
+            except EOFError:
+                return
+
+    return header, records()
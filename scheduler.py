@@ -0,0 +1,59 @@
+import asyncio
+
+
+# fixed timestep driven by loop.time(): ticks are due every 1 / tick_rate
+# seconds no matter how long the previous one took. After an overrun the
+# missed ticks are simulated back to back, at most max_catch_up of them, the
+# rest are skipped and the schedule moves on.
+class TickScheduler:
+    def __init__(self, tick_rate=20, max_catch_up=5):
+        self.tick_rate = tick_rate
+        self.period = 1 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.next_tick = None
+
+        self.ticks = 0
+        self.steps = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.last_work_time = 0.0
+        self.max_work_time = 0.0
+        self.total_work_time = 0.0
+
+    def reset(self):
+        # forget the schedule, e.g. while the server sits idle
+        self.next_tick = None
+
+    async def wait(self):
+        # sleeps until the next tick is due and returns how many simulation
+        # steps have to run to get back on schedule
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_tick is None:
+            self.next_tick = now
+        while now < self.next_tick:
+            await asyncio.sleep(self.next_tick - now)
+            now = loop.time()
+
+        due = int((now - self.next_tick) // self.period) + 1
+        self.next_tick += due * self.period
+        if due > self.max_catch_up:
+            self.skipped += due - self.max_catch_up
+            due = self.max_catch_up
+
+        self.ticks += 1
+        self.steps += due
+        return due
+
+    def record(self, work_time):
+        # time spent on one tick, compared against the period it had
+        self.last_work_time = work_time
+        self.max_work_time = max(self.max_work_time, work_time)
+        self.total_work_time += work_time
+        if work_time > self.period:
+            self.overruns += 1
+
+    def summary(self):
+        average = self.total_work_time / self.ticks if self.ticks else 0.0
+        return (f'{self.ticks} ticks, {self.steps} steps, {self.skipped} skipped, {self.overruns} overruns, '
+                f'work avg {average * 1000:.2f} ms max {self.max_work_time * 1000:.2f} ms of {self.period * 1000:.2f} ms budget')
@@ -0,0 +1,59 @@
+import math
+
+
+# uniform grid used as collision broad-phase: items are bucketed by the cell
+# their (x, y) falls into, a query returns every item in the cells overlapping
+# a rectangle and the caller still does the exact overlap test
+class SpatialHash:
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = {}
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cell_key(self, x, y):
+        return math.floor(x / self.cell_width), math.floor(y / self.cell_height)
+
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+
+    def insert(self, item, x, y):
+        key = self.cell_key(x, y)
+        self.keys[id(item)] = key
+        self.cells.setdefault(key, []).append(item)
+
+    def remove(self, item):
+        key = self.keys.pop(id(item), None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        cell.remove(item)
+        if not cell:
+            del self.cells[key]
+
+    def move(self, item, x, y):
+        key = self.cell_key(x, y)
+        old_key = self.keys.get(id(item))
+        if old_key == key:
+            return
+        if old_key is not None:
+            self.remove(item)
+        self.keys[id(item)] = key
+        self.cells.setdefault(key, []).append(item)
+
+    def query(self, x, y, half_width, half_height):
+        # every item whose cell overlaps [x - half_width, x + half_width] x [y - half_height, y + half_height]
+        min_col, min_row = self.cell_key(x - half_width, y - half_height)
+        max_col, max_row = self.cell_key(x + half_width, y + half_height)
+        cells = self.cells
+        found = []
+        for col in range(min_col, max_col + 1):
+            for row in range(min_row, max_row + 1):
+                cell = cells.get((col, row))
+                if cell:
+                    found.extend(cell)
+        return found
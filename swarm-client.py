@@ -0,0 +1,241 @@
+# Headless load generator: many bots talking the text protocol from one process
+#
+#   python swarm-client.py --bots 500 --duration 30
+#
+# Every bot does the id: handshake, sends "x,y,fire" inputs with random
+# movement and firing, and reads the state snapshots. Reported:
+#   - snapshot inter-arrival time and its jitter (standard deviation)
+#   - input-to-state latency, from sending a shot to the first snapshot that
+#     holds the new bullet
+#   - bytes per second in both directions
+# A bot that gets shot down joins again as a new player unless --no-respawn.
+# With --compress the bots ask for compressed snapshots and the bytes in are
+# counted as they come off the wire.
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+import protocol
+
+
+class Stats:
+    def __init__(self):
+        self.intervals = []
+        self.latencies = []
+        self.snapshots = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.lost_shots = 0
+        self.deaths = 0
+        self.connected = 0
+        self.failed = 0
+
+    def reset_window(self):
+        self.intervals = []
+        self.latencies = []
+        self.snapshots = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.lost_shots = 0
+        self.deaths = 0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def own_state(message, player_id, prefix):
+    # this bot's life and {id: active} of its bullets in a text snapshot,
+    # without parsing the rest. Life is 0 once the bot is gone from the game.
+    separator = message.index(b':')
+    fields = message[:separator].split(b',')
+    life = next((int(life) for record_id, life in zip(fields[0::4], fields[3::4]) if record_id == player_id), 0)
+    fields = message[separator + 1:].rstrip(b'\n').split(b',')
+    return life,  {bullet_id: status == b' 1' for bullet_id, status in zip(fields[0::4], fields[1::4]) if bullet_id.startswith(prefix)}
+
+
+class Bot:
+    def __init__(self, stats, rng, input_interval, fire_chance, compress=False):
+        self.stats = stats
+        self.compress = compress
+        self.rng = rng
+        self.input_interval = input_interval
+        self.fire_chance = fire_chance
+        self.player_id = None
+        self.prefix = None
+        self.bullets = {}
+        # when the shot being timed was sent, None while no shot is in flight
+        self.shot_sent = None
+        self.shot_timeout = 1.0
+
+    async def run(self, host, port, stop_at, respawn):
+        while time.monotonic() < stop_at:
+            await self.play(host, port, stop_at)
+            if not respawn:
+                return
+
+    async def play(self, host, port, stop_at):
+        self.bullets = {}
+        self.shot_sent = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            handshake = await reader.readline()
+            player_id, _, _, compression = protocol.decode_handshake(handshake)
+        except (OSError, IndexError, ValueError):
+            self.stats.failed += 1
+            await asyncio.sleep(1)
+            return
+        self.player_id = str(player_id).encode()
+        self.prefix = f'{player_id}_'.encode()
+        self.stats.connected += 1
+        self.stats.bytes_received += len(handshake)
+
+        decompressor = None
+        if self.compress and compression:
+            hello = protocol.encode_hello(protocol.TEXT, True)
+            writer.write(hello)
+            self.stats.bytes_sent += len(hello)
+            decompressor = protocol.Decompressor(reader)
+            reader = decompressor.reader
+
+        # the server only answers after the first input
+        self.send(writer, 0, 0, 0)
+        sender = asyncio.create_task(self.send_inputs(writer, stop_at))
+        try:
+            await self.receive(reader, stop_at, decompressor)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            sender.cancel()
+            if decompressor is not None:
+                decompressor.task.cancel()
+            writer.close()
+            self.stats.connected -= 1
+
+    def send(self, writer, move_x, move_y, fire):
+        message = f'{move_x},{move_y},{fire}\n'.encode()
+        writer.write(message)
+        self.stats.bytes_sent += len(message)
+
+    async def send_inputs(self, writer, stop_at):
+        # scattered start so the bots do not all send in the same instant
+        await asyncio.sleep(self.rng.random() * self.input_interval)
+        while time.monotonic() < stop_at:
+            fire = 0
+            if self.shot_sent is not None and time.monotonic() - self.shot_sent > self.shot_timeout:
+                # the server never showed it, e.g. the input was merged away or we were hit
+                self.stats.lost_shots += 1
+                self.shot_sent = None
+            # only time a shot the server will accept, at most 3 bullets fly at once
+            active = sum(self.bullets.values())
+            if self.shot_sent is None and active < 3 and self.rng.random() < self.fire_chance:
+                fire = 1
+                self.shot_sent = time.monotonic()
+            self.send(writer, self.rng.choice((-1, 0, 1)), self.rng.choice((-1, 0, 1)), fire)
+            await writer.drain()
+            await asyncio.sleep(self.input_interval)
+
+    async def receive(self, reader, stop_at, decompressor=None):
+        last_arrival = None
+        # compressed bytes already counted
+        counted = 0
+        while time.monotonic() < stop_at:
+            message = await reader.readline()
+            if not message:
+                return
+            now = time.monotonic()
+            self.stats.snapshots += 1
+            if decompressor is None:
+                self.stats.bytes_received += len(message)
+            else:
+                self.stats.bytes_received += decompressor.bytes_received - counted
+                counted = decompressor.bytes_received
+            if last_arrival is not None:
+                self.stats.intervals.append(now - last_arrival)
+            last_arrival = now
+
+            life, bullets = own_state(message, self.player_id, self.prefix)
+            if life <= 0:
+                # the server keeps a dead player's connection open but stops sending
+                self.stats.deaths += 1
+                return
+            if self.shot_sent is not None and bullets.keys() - self.bullets.keys():
+                self.stats.latencies.append(now - self.shot_sent)
+                self.shot_sent = None
+            self.bullets = bullets
+
+
+def report(stats, elapsed, label):
+    intervals = stats.intervals
+    latencies = stats.latencies
+    jitter = statistics.pstdev(intervals) if len(intervals) > 1 else 0.0
+    print(f'[{label}] bots {stats.connected} (failed {stats.failed}, died {stats.deaths}), '
+          f'{stats.snapshots / elapsed:.0f} snapshots/s, '
+          f'in {stats.bytes_received / elapsed / 1024:.1f} KiB/s, out {stats.bytes_sent / elapsed / 1024:.1f} KiB/s')
+    print(f'    inter-arrival ms: mean {statistics.fmean(intervals) * 1000 if intervals else 0:.1f} '
+          f'p50 {percentile(intervals, 0.5) * 1000:.1f} p99 {percentile(intervals, 0.99) * 1000:.1f} '
+          f'jitter {jitter * 1000:.1f}')
+    print(f'    input-to-state ms ({len(latencies)} shots, {stats.lost_shots} lost): p50 {percentile(latencies, 0.5) * 1000:.1f} '
+          f'p90 {percentile(latencies, 0.9) * 1000:.1f} p99 {percentile(latencies, 0.99) * 1000:.1f} '
+          f'max {max(latencies, default=0) * 1000:.1f}')
+
+
+async def swarm(args):
+    stats = Stats()
+    total = Stats()
+    rng = random.Random(args.seed)
+    start = time.monotonic()
+    stop_at = start + args.duration
+
+    bots = []
+    for i in range(args.bots):
+        bot = Bot(stats, random.Random(rng.random()), args.input_interval, args.fire_chance, args.compress)
+        bots.append(asyncio.create_task(bot.run(args.host, args.port, stop_at, not args.no_respawn)))
+        if args.ramp:
+            await asyncio.sleep(1 / args.ramp)
+
+    window_start = time.monotonic()
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(min(args.report_every, max(0.0, stop_at - time.monotonic())))
+        now = time.monotonic()
+        report(stats, now - window_start, f'{now - start:.0f}s')
+        total.intervals += stats.intervals
+        total.latencies += stats.latencies
+        total.snapshots += stats.snapshots
+        total.bytes_received += stats.bytes_received
+        total.bytes_sent += stats.bytes_sent
+        total.lost_shots += stats.lost_shots
+        total.deaths += stats.deaths
+        stats.reset_window()
+        window_start = now
+
+    await asyncio.gather(*bots, return_exceptions=True)
+    total.connected = args.bots
+    total.failed = stats.failed
+    report(total, time.monotonic() - start, 'total')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format="BOT: %(asctime)s: %(message)s", level=logging.WARNING, datefmt="%F-%H-%M-%S")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--bots', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run')
+    parser.add_argument('--ramp', type=float, default=200, help='bots connected per second, 0 for all at once')
+    parser.add_argument('--input-interval', type=float, default=0.2, help='seconds between inputs of a bot')
+    parser.add_argument('--fire-chance', type=float, default=0.3, help='chance an input fires')
+    parser.add_argument('--report-every', type=float, default=5, help='seconds between reports')
+    parser.add_argument('--no-respawn', action='store_true', help='do not reconnect bots that died')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compress', action='store_true', help='ask the server for compressed snapshots')
+    args = parser.parse_args()
+
+    asyncio.run(swarm(args))
@@ -0,0 +1,77 @@
+import asyncio
+import random
+from dataclasses import dataclass
+
+import protocol
+
+# snapshots bigger than this go over TCP, a datagram can not hold them
+MAX_DATAGRAM = 65000
+
+
+@dataclass
+class Impairment:
+    # share of datagrams dropped
+    loss: float = 0.0
+    # seconds every datagram is held back
+    latency: float = 0.0
+    # up to this many seconds more at random, which also reorders them
+    jitter: float = 0.0
+
+
+# stands in for a datagram transport and drops and delays what is sent
+# through it, to try the UDP path over loopback
+class ImpairedTransport:
+    def __init__(self, transport, impairment, seed=None):
+        self.transport = transport
+        self.impairment = impairment
+        self.random = random.Random(seed)
+        self.dropped = 0
+
+    def sendto(self, data, address=None):
+        if self.random.random() < self.impairment.loss:
+            self.dropped += 1
+            return
+        delay = self.impairment.latency + self.random.uniform(0, self.impairment.jitter)
+        if delay <= 0:
+            self.transport.sendto(data, address)
+        else:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, data, address)
+
+    def close(self):
+        self.transport.close()
+
+
+def frames_of(data):
+    # the frames of one datagram, a malformed datagram has none
+    try:
+        return protocol.split_frames(data)
+    except ValueError:
+        return []
+
+
+class SnapshotDatagrams(asyncio.DatagramProtocol):
+    # server side, takes the clients' requests to get their snapshots over UDP
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, address):
+        for message_type, body in frames_of(data):
+            if message_type == protocol.MSG_UDP_BIND:
+                try:
+                    player_id, token = protocol.decode_udp_bind(body)
+                except ValueError:
+                    continue
+                self.server.bind_udp(player_id, token, address)
+
+
+class SnapshotListener(asyncio.DatagramProtocol):
+    # client side, hands the frames of every datagram to on_frames
+    def __init__(self, on_frames):
+        self.on_frames = on_frames
+        self.received = 0
+
+    def datagram_received(self, data, address):
+        frames = frames_of(data)
+        if frames:
+            self.received += 1
+            self.on_frames(frames)
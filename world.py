@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+
+import physics
+from spatial_hash import SpatialHash
+
+# the game itself: ships, bullets and the rules moving them, without sockets,
+# a screen or a clock. game-server.py runs it behind the network, main.py
+# runs it on one keyboard and the benchmarks run it as fast as it goes.
+
+
+@dataclass(slots=True, eq=False)
+class Ship:
+    x: float
+    y: float
+    id: int
+
+    speed_x: float = 0
+    speed_y: float = 0
+    # bullets of this ship still flying
+    fire: int = 0
+    width: float = physics.PLAYER_WIDTH
+    height: float = physics.PLAYER_HEIGHT
+    life_point: int = 3
+    shots: int = 0
+    # which way its bullets fly, -1 up the screen and 1 down
+    bullet_direction: int = -1
+
+
+class Bullet:
+    __slots__ = ('x', 'y', 'speed_y', 'player_id', 'seq', 'is_active')
+
+    width = 10
+    height = 10
+    # pixels per second
+    speed = 20
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.speed_y = -self.speed
+        self.player_id = 0
+        self.seq = 0
+        self.is_active = True
+
+    @property
+    def id(self):
+        return f"{self.player_id}_{self.seq}"
+
+class BulletPool:
+    # recycles inactive bullets so sustained firing does not allocate
+    def __init__(self):
+        self.free = []
+        self.created = 0
+
+    def acquire(self):
+        if self.free:
+            bullet = self.free.pop()
+            bullet.is_active = True
+            return bullet
+        self.created += 1
+        return Bullet()
+
+    def release(self, bullet):
+        self.free.append(bullet)
+
+
+class World:
+    def __init__(self, tick_rate=20):
+        self.players = []
+        self.bullets = []
+        self.bullet_pool = BulletPool()
+        self.game_field_width = physics.FIELD_WIDTH
+        self.game_field_height = physics.FIELD_HEIGHT
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.thrust = physics.THRUST
+        self.acceleration = physics.ACCELERATION
+        self.player_width = physics.PLAYER_WIDTH
+        self.player_height = physics.PLAYER_HEIGHT
+        self.tick = 0
+
+    def new_player(self, x, y, player_id):
+        return Ship(x, y, player_id)
+
+    def add_player(self, player):
+        self.players.append(player)
+
+    def remove_player(self, player):
+        self.players.remove(player)
+
+    def spawn_bullet(self, player, seq):
+        bullet = self.bullet_pool.acquire()
+        bullet.seq = seq
+        bullet.x = player.x + player.width / 2 - bullet.width / 2
+        bullet.y = player.y + player.height / 2 - bullet.height / 2
+        bullet.speed_y = bullet.speed * player.bullet_direction
+        bullet.player_id = player.id
+        self.bullets.append(bullet)
+
+    def bullet_count(self):
+        return len(self.bullets)
+
+    def apply_input(self, player, move_x, move_y, fire):
+        player.speed_x += move_x * self.thrust
+        player.speed_y += move_y * self.thrust
+        if fire == 1:
+            player.shots += 1
+            if player.fire < 3:
+                player.fire += 1
+                self.spawn_bullet(player, player.shots)
+
+    def step(self, inputs, steps=1):
+        # one tick. inputs maps a player to its (move_x, move_y, fire) for this
+        # tick, players without one keep drifting. steps > 1 catches up on
+        # ticks that were missed. Returns the state as (players, bullets):
+        #   players: (id, x, y, life_point)
+        #   bullets: (owner id, sequence, is_active, x, y)
+        for player, (move_x, move_y, fire) in inputs.items():
+            self.apply_input(player, move_x, move_y, fire)
+        state = self.update_state() if steps == 1 else self.catch_up(steps)
+        self.tick += 1
+        return state
+
+    def update_state(self):
+        player_records = []
+        bullet_records = []
+        dt = self.dt
+        friction = self.acceleration * 0.5 * dt
+        max_x = self.game_field_width - self.player_width
+        max_y = self.game_field_height - self.player_height
+
+        # broad-phase grids, players are keyed by where they will be after this
+        # tick's move and re-keyed as soon as they have moved
+        player_grid = SpatialHash(self.player_width, self.player_height)
+        for player in self.players:
+            player_grid.insert(player, player.x + player.speed_x * dt, player.y + player.speed_y * dt)
+
+        bullet_grid = SpatialHash(self.player_width, self.player_height)
+        for bullet in self.bullets:
+            bullet_grid.insert(bullet, bullet.x, bullet.y + bullet.speed_y * dt)
+
+        for player in self.players:
+            # prevent player from colliding each other
+            future_player_x = player.x + player.speed_x * dt
+            future_player_y = player.y + player.speed_y * dt
+            for other_player in player_grid.query(future_player_x, future_player_y, self.player_width, self.player_height):
+                if other_player.id != player.id:
+                    future_other_player_x = other_player.x + other_player.speed_x * dt
+                    future_other_player_y = other_player.y + other_player.speed_y * dt
+                    if abs(future_player_x - future_other_player_x) < self.player_width and abs(future_player_y - future_other_player_y) < self.player_height:
+                        player.speed_x = 0
+                        player.speed_y = 0
+                        break
+
+
+            player.x, player.y, player.speed_x, player.speed_y = physics.move(player.x, player.y, player.speed_x, player.speed_y, dt, friction, max_x, max_y)
+
+            player_grid.move(player, player.x + player.speed_x * dt, player.y + player.speed_y * dt)
+
+            #prevent bullet hit the other players
+            for bullet in bullet_grid.query(player.x, player.y, self.player_width, self.player_height):
+                if player.id != bullet.player_id:
+                    if abs(player.x - bullet.x) <= self.player_width and abs(player.y - (bullet.y + bullet.speed_y * dt)) <= self.player_height:
+                        bullet.is_active = False
+                        player.life_point -= 1
+
+
+            player_records.append((player.id, player.x, player.y, player.life_point))
+
+        for bullet in self.bullets:
+
+            bullet.y += bullet.speed_y * dt
+
+            #prevent bullet out of screen
+            if bullet.x < 0 or bullet.x > self.game_field_width or bullet.y < 0 or bullet.y > self.game_field_height:
+                bullet.is_active = False
+
+
+            bullet_records.append((bullet.player_id, bullet.seq, bullet.is_active, bullet.x, bullet.y))
+
+            if not bullet.is_active:
+                for player in self.players:
+                    if bullet.player_id == player.id:
+                        player.fire -= 1
+                self.bullets.remove(bullet)
+                self.bullet_pool.release(bullet)
+
+        return player_records, bullet_records
+
+    def catch_up(self, steps):
+        # runs several simulation steps for one snapshot, bullets that died in
+        # the skipped snapshots are still reported once
+        dead_bullets = []
+        for _ in range(steps - 1):
+            players, bullets = self.update_state()
+            dead_bullets.extend(bullet for bullet in bullets if not bullet[2])
+        players, bullets = self.update_state()
+        return players, dead_bullets + bullets
+
+    def remove_dead(self):
+        for player in [player for player in self.players if player.life_point == 0]:
+            self.remove_player(player)